@@ -3,11 +3,193 @@
 
 from __future__ import annotations
 
+import time
 
-def main() -> None:
+_STARTED_AT = time.perf_counter()
+
+import argparse
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+
+
+def _parse_utc(value: str) -> datetime:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="StartaleGM: мониторинг GM и отчёты по журналу запусков")
+    sub = parser.add_subparsers(dest="command")
+    monitor = sub.add_parser("monitor", help="мониторинг GM по расписанию (по умолчанию)")
+    monitor.add_argument("--workers", type=int, help="сколько аккаунтов обрабатывать параллельно (по умолчанию 1)")
+    monitor.add_argument("--adaptive", action="store_true",
+                         help="подбирать число параллельных запусков по нагрузке хоста (--workers — максимум)")
+    monitor.add_argument("--policy", choices=("edf", "poll"), help="политика планировщика (по умолчанию edf)")
+    monitor.add_argument("--lookahead", type=float,
+                         help="за сколько секунд до срока GM начинать подготовку аккаунта (по умолчанию 90, 0 — выкл.)")
+    monitor.add_argument("--asset-cache", action="store_true", help="общий дисковый кэш JS/CSS сайтов (asset_cache/)")
+    monitor.add_argument("--batch", type=int,
+                         help="до N аккаунтов с готовым смарт-аккаунтом в одном браузере (по умолчанию 1 — выкл.)")
+
+    report = sub.add_parser("report", help="отчёт по журналу запусков run_history.jsonl")
+    report.add_argument("--hours", type=float, default=24.0, help="окно отчёта в часах до --until (по умолчанию 24)")
+    report.add_argument("--since", type=_parse_utc, help="начало окна (ISO, UTC); перекрывает --hours")
+    report.add_argument("--until", type=_parse_utc, help="конец окна (ISO, UTC); по умолчанию сейчас")
+    report.add_argument("--json", action="store_true", help="вывести отчёт в JSON")
+
+    imports = sub.add_parser("imports", help="профиль времени импорта модулей (python -X importtime)")
+    imports.add_argument("--module", default="modules.startalegm", help="что импортировать (по умолчанию modules.startalegm)")
+    imports.add_argument("--top", type=int, default=20, help="сколько самых медленных модулей показать")
+
+    sub.add_parser("metrics", help="показать metrics.json работающего мониторинга")
+
+    compact = sub.add_parser("compact", help="удалить из журнала запусков записи старше N дней")
+    compact.add_argument("--keep-days", type=int, default=90, help="сколько дней истории оставить (по умолчанию 90)")
+
+    ctl = sub.add_parser("ctl", help="команда работающему мониторингу через startalegm.sock")
+    ctl.add_argument("cmd", choices=("pause", "resume", "drain", "run", "concurrency", "state"),
+                     help="pause/resume — приостановить/продолжить новые запуски; drain — завершиться после текущих; "
+                          "run <адрес> — запустить аккаунт сейчас; concurrency <n> — число параллельных запусков; "
+                          "state — состояние планировщика")
+    ctl.add_argument("args", nargs="*", help="аргументы команды")
+
+    simulate = sub.add_parser("simulate", help="симуляция планировщика на виртуальных часах (без браузера)")
+    simulate.add_argument("--accounts", type=int, default=1000, help="число синтетических аккаунтов")
+    simulate.add_argument("--days", type=float, default=7.0, help="сколько виртуальных суток моделировать")
+    simulate.add_argument("--workers", default="1,2,4", help="числа воркеров через запятую (по умолчанию 1,2,4)")
+    simulate.add_argument("--policy", default="edf,poll", help="политики через запятую (по умолчанию edf,poll)")
+    simulate.add_argument("--seed", type=int, default=0, help="seed генератора случайных чисел")
+    simulate.add_argument("--per-day", action="store_true", help="показать разбивку по дням")
+    simulate.add_argument("--json", action="store_true", help="вывести результаты в JSON")
+    return parser
+
+
+def _profile_imports(module: str, top: int) -> None:
+    """Импортирует module в отдельном процессе с -X importtime и печатает самые дорогие импорты (кумулятивно)."""
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).resolve().parent,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # строка заголовка
+        rows.append((cumulative_us, self_us, parts[2].rstrip()))
+    if proc.returncode != 0 or not rows:
+        print(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"Не удалось импортировать {module}")
+        return
+    total = next((cum for cum, _, name in reversed(rows) if name.strip() == module), max(r[0] for r in rows))
+    print(f"import {module}: {total / 1e6:.3f} с")
+    print(f"{'кумулятивно, мс':>16} {'собственное, мс':>16}  модуль")
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative_us / 1e3:16.1f} {self_us / 1e3:16.1f}  {name}")
+
+
+def _simulate(args: argparse.Namespace) -> None:
+    """
+    Прогон симулятора по всем сочетаниям --workers × --policy с распределениями из журнала запусков.
+    Сочетания независимы и считаются в отдельных процессах (до числа ядер).
+    """
+    import json
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from contextlib import nullcontext
+    from modules import simulator
+
+    dist = simulator.Distributions.from_history(seed=args.seed)
+    if not args.json:
+        print(f"Аккаунтов {args.accounts}, суток {args.days:g}, распределения: {dist.source} "
+              f"(ошибок {dist.failure_rate * 100:.1f}%)")
+    combos = [
+        (policy, workers)
+        for policy in [p.strip() for p in args.policy.split(",") if p.strip()]
+        for workers in [int(w) for w in args.workers.split(",") if w.strip()]
+    ]
+    processes = min(len(combos), os.cpu_count() or 1)
+    params = [(args.accounts, args.days, workers, policy, dist, args.seed) for policy, workers in combos]
+    results = []
+    with ProcessPoolExecutor(max_workers=processes) if processes > 1 else nullcontext() as pool:
+        run = pool.map if pool is not None else map
+        for result in run(simulator.simulate_timed, *zip(*params)):
+            results.append(result)
+            if not args.json:
+                print(simulator.format_result(result, per_day=args.per_day) + f"  [{result['wall_sec']:.1f} с]")
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    args = _build_parser().parse_args(argv)
+    if args.command == "report":
+        import json
+        from modules import history
+
+        until = args.until or datetime.now(timezone.utc)
+        since = args.since or until - timedelta(hours=args.hours)
+        report = history.build_report(since, until)
+        print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else history.format_report(report))
+        return
+    if args.command == "imports":
+        _profile_imports(args.module, args.top)
+        return
+    if args.command == "metrics":
+        import json
+        from modules import metrics
+
+        data = metrics.read_file()
+        print(json.dumps(data, ensure_ascii=False, indent=2) if data else "metrics.json пуст или отсутствует")
+        return
+    if args.command == "compact":
+        from modules import history
+
+        kept, dropped = history.compact(args.keep_days)
+        print(f"Журнал запусков: оставлено {kept}, удалено {dropped}")
+        return
+    if args.command == "ctl":
+        import json
+        from modules import control
+
+        try:
+            response = control.send_command(args.cmd, args.args)
+        except OSError as e:
+            print(f"Мониторинг не отвечает ({control.CONTROL_SOCKET_PATH.name}): {e}")
+            raise SystemExit(1)
+        print(json.dumps(response, ensure_ascii=False, indent=2))
+        if not response.get("ok"):
+            raise SystemExit(1)
+        return
+    if args.command == "simulate":
+        _simulate(args)
+        return
     from modules.startalegm import run as startalegm_run
-    startalegm_run()
+    options = {}
+    if getattr(args, "workers", None):
+        options["workers"] = args.workers
+    if getattr(args, "policy", None):
+        options["policy"] = args.policy
+    if getattr(args, "adaptive", False):
+        options["adaptive"] = True
+    if getattr(args, "lookahead", None) is not None:
+        options["lookahead"] = args.lookahead
+    if getattr(args, "asset_cache", False):
+        options["asset_cache"] = True
+    if getattr(args, "batch", None):
+        options["batch"] = args.batch
+    startalegm_run(started_at=_STARTED_AT, **options)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
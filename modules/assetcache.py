@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий дисковый кэш неизменяемых статических ассетов (JS/CSS/шрифты/картинки) для одноразовых профилей.
+
+Каждый запуск идёт в новом профиле AdsPower с пустым кэшем браузера, поэтому бандлы portal.soneium.org
+и app.startale.com скачиваются через прокси заново. Если кэш включён, на каждой странице сценария
+включается перехват CDP Fetch только для URL ассетов (шаблоны по доменам и расширениям): ассет, уже лежащий
+в кэше, отдаётся с диска (Fetch.fulfillRequest), иначе запрос идёт как обычно — через браузер и его прокси —
+а ответ сохраняется обработчиком события response. Playwright route здесь не используется: с ним Playwright
+отключает HTTP-кэш браузера для всего контекста, и всё некэшируемое нами (картинки без хэша, сторонние
+скрипты) качалось бы заново при каждой навигации и перезагрузке страницы.
+
+Кэшируются только GET-ответы 200 с хэшем в имени файла (или из /_next/static/) и длинным
+Cache-Control (immutable или max-age ≥ ASSET_MIN_MAX_AGE_SEC). Тела хранятся по sha256 содержимого
+(одинаковые файлы с разных URL лежат один раз), общий размер ограничен ASSET_CACHE_MAX_BYTES (LRU).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+
+from modules import metrics
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+ASSET_CACHE_DIR = PROJECT_ROOT / "asset_cache"
+ASSET_CACHE_INDEX = ASSET_CACHE_DIR / "index.json"
+# Включить без флага командной строки (python main.py monitor --asset-cache)
+ASSET_CACHE_ENABLED = False
+ASSET_CACHE_MAX_BYTES = 300 * 1024 * 1024
+ASSET_MIN_MAX_AGE_SEC = 7 * 86400
+# Домены (и их поддомены), ассеты которых кэшируются
+ASSET_HOSTS = ("portal.soneium.org", "startale.com")
+ASSET_EXTENSIONS = (".js", ".mjs", ".css", ".woff", ".woff2", ".ttf", ".otf", ".png", ".jpg", ".jpeg",
+                    ".gif", ".svg", ".webp", ".avif", ".ico", ".wasm")
+# Заголовки ответа, которые сохраняются и отдаются из кэша (кодировка/длина — нет: тело хранится распакованным)
+KEEP_HEADERS = ("content-type", "cache-control", "access-control-allow-origin", "timing-allow-origin", "etag",
+                "last-modified")
+
+# Шаблоны CDP Fetch.enable: перехватываются только запросы, похожие на ассеты (точная проверка — _is_candidate_url)
+FETCH_PATTERNS = [
+    {"urlPattern": f"https://{prefix}{host}/*{ext}{suffix}", "requestStage": "Request"}
+    for host in ASSET_HOSTS
+    for prefix in ("", "*.")
+    for ext in ASSET_EXTENSIONS
+    for suffix in ("", "?*")
+]
+
+_HASHED_NAME_RE = re.compile(r"[.\-_~][0-9a-zA-Z_\-]{8,}\.[0-9a-z]+$")
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def _is_candidate_url(url: str) -> bool:
+    parts = urlsplit(url)
+    if parts.scheme != "https":
+        return False
+    host = parts.hostname or ""
+    if not any(host == h or host.endswith("." + h) for h in ASSET_HOSTS):
+        return False
+    path = parts.path.lower()
+    if not path.endswith(ASSET_EXTENSIONS):
+        return False
+    return "/_next/static/" in path or bool(_HASHED_NAME_RE.search(path.rsplit("/", 1)[-1]))
+
+
+def _is_immutable(headers: dict[str, str]) -> bool:
+    cache_control = (headers.get("cache-control") or "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return False
+    if "immutable" in cache_control:
+        return True
+    m = _MAX_AGE_RE.search(cache_control)
+    return bool(m and int(m.group(1)) >= ASSET_MIN_MAX_AGE_SEC)
+
+
+class AssetCache:
+    """Индекс URL → sha256 и объекты на диске с LRU-вытеснением. Потокобезопасен (запуски идут в воркерах)."""
+
+    def __init__(self, root: Path = ASSET_CACHE_DIR, max_bytes: int = ASSET_CACHE_MAX_BYTES):
+        self.root = root
+        self.index_path = root / ASSET_CACHE_INDEX.name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._urls: dict[str, dict[str, Any]] = {}  # url -> {"sha256", "headers"}
+        self._objects: dict[str, dict[str, Any]] = {}  # sha256 -> {"size", "last_used"}
+        self._total_bytes = 0
+        self._dirty = False
+        # Счётчики процесса
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self.bytes_served = 0
+        # Состояние по контекстам: обработчики (отписка требует те же объекты), CDP-сессии страниц, счётчики
+        self._handlers: dict[int, dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, ValueError, OSError):
+            return
+        for sha, rec in (data.get("objects") or {}).items():
+            if (self._object_path(sha)).exists():
+                self._objects[sha] = {"size": int(rec.get("size", 0)), "last_used": float(rec.get("last_used", 0))}
+        self._urls = {u: r for u, r in (data.get("urls") or {}).items() if r.get("sha256") in self._objects}
+        self._total_bytes = sum(o["size"] for o in self._objects.values())
+
+    def _object_path(self, sha: str) -> Path:
+        return self.root / "objects" / sha[:2] / sha
+
+    def save(self) -> None:
+        """Атомарно сохраняет индекс (если были изменения)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"urls": dict(self._urls), "objects": {k: dict(v) for k, v in self._objects.items()}}
+            self._dirty = False
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+
+    def lookup(self, url: str) -> Optional[tuple[dict[str, str], bytes]]:
+        """(заголовки, тело) из кэша или None."""
+        with self._lock:
+            rec = self._urls.get(url)
+            if rec is None:
+                return None
+            sha = rec["sha256"]
+            obj = self._objects.get(sha)
+            if obj is None:
+                return None
+            obj["last_used"] = time.time()
+            self._dirty = True
+        try:
+            body = self._object_path(sha).read_bytes()
+        except OSError:
+            with self._lock:
+                self._forget_object(sha)
+            return None
+        return rec["headers"], body
+
+    def store(self, url: str, headers: dict[str, str], body: bytes) -> None:
+        """Сохраняет тело по sha256 (если такого ещё нет) и привязывает к нему URL; при переполнении — LRU."""
+        sha = hashlib.sha256(body).hexdigest()
+        kept = {k: v for k, v in headers.items() if k.lower() in KEEP_HEADERS}
+        with self._lock:
+            known = sha in self._objects
+        if not known:
+            path = self._object_path(sha)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{sha}.{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(body)
+            os.replace(tmp_path, path)
+        with self._lock:
+            if sha not in self._objects:
+                self._objects[sha] = {"size": len(body), "last_used": time.time()}
+                self._total_bytes += len(body)
+                self.stored += 1
+            self._urls[url] = {"sha256": sha, "headers": kept}
+            self._dirty = True
+            self._evict_locked()
+
+    def _forget_object(self, sha: str) -> None:
+        obj = self._objects.pop(sha, None)
+        if obj:
+            self._total_bytes -= obj["size"]
+        for url in [u for u, r in self._urls.items() if r["sha256"] == sha]:
+            del self._urls[url]
+        self._dirty = True
+
+    def _evict_locked(self) -> None:
+        if self._total_bytes <= self.max_bytes:
+            return
+        for sha, _ in sorted(self._objects.items(), key=lambda kv: kv[1]["last_used"]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._forget_object(sha)
+            self.evicted += 1
+            try:
+                self._object_path(sha).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            requests_total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / requests_total, 3) if requests_total else None,
+                "bytes_served": self.bytes_served,
+                "stored": self.stored,
+                "evicted": self.evicted,
+                "objects": len(self._objects),
+                "urls": len(self._urls),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- Playwright ---
+
+    async def attach(self, context) -> None:
+        """Включает перехват ассетов на страницах контекста (и новых popup) и обработчик response."""
+        counters = {"hits": 0, "misses": 0, "bytes": 0}
+        sessions: list[Any] = []
+
+        async def on_paused(session, event: dict[str, Any]) -> None:
+            request_id = event["requestId"]
+            request = event.get("request") or {}
+            url = request.get("url", "")
+            try:
+                cached = None
+                if request.get("method") == "GET" and _is_candidate_url(url):
+                    cached = await asyncio.to_thread(self.lookup, url)
+                if cached is None:
+                    counters["misses"] += 1
+                    with self._lock:
+                        self.misses += 1
+                    await session.send("Fetch.continueRequest", {"requestId": request_id})
+                    return
+                headers, body = cached
+                counters["hits"] += 1
+                counters["bytes"] += len(body)
+                with self._lock:
+                    self.hits += 1
+                    self.bytes_served += len(body)
+                await session.send(
+                    "Fetch.fulfillRequest",
+                    {
+                        "requestId": request_id,
+                        "responseCode": 200,
+                        "responseHeaders": [{"name": k, "value": v} for k, v in headers.items()],
+                        "body": base64.b64encode(body).decode("ascii"),
+                    },
+                )
+            except Exception as e:
+                logger.debug("Перехват ассета не удался ({}): {}", url, e)
+
+        async def attach_page(page) -> None:
+            try:
+                session = await context.new_cdp_session(page)
+                session.on("Fetch.requestPaused", lambda event: on_paused(session, event))
+                await session.send("Fetch.enable", {"patterns": FETCH_PATTERNS})
+                sessions.append(session)
+            except Exception as e:
+                logger.debug("Кэш ассетов не подключён к странице {}: {}", page.url, e)
+
+        async def on_page(page) -> None:
+            await attach_page(page)
+
+        async def on_response(response) -> None:
+            url = response.url
+            if response.status != 200 or not _is_candidate_url(url) or response.request.method != "GET":
+                return
+            with self._lock:
+                if url in self._urls:
+                    return  # отдан из кэша или уже сохранён
+            try:
+                headers = await response.all_headers()
+                if not _is_immutable(headers):
+                    return
+                body = await response.body()
+                await asyncio.to_thread(self.store, url, headers, body)
+            except Exception as e:
+                logger.debug("Ассет не сохранён в кэш ({}): {}", url, e)
+
+        self._handlers[id(context)] = {
+            "on_page": on_page, "on_response": on_response, "sessions": sessions, "counters": counters,
+        }
+        context.on("response", on_response)
+        context.on("page", on_page)
+        for page in context.pages:
+            if not page.url.startswith("chrome-extension://"):
+                await attach_page(page)
+
+    async def detach(self, context, flow: str) -> None:
+        """Снимает обработчики, логирует попадания за сценарий, сохраняет индекс и публикует метрики."""
+        entry = self._handlers.pop(id(context), None)
+        if entry is None:
+            return
+        counters = entry["counters"]
+        try:
+            context.remove_listener("response", entry["on_response"])
+            context.remove_listener("page", entry["on_page"])
+        except Exception:
+            pass
+        for session in entry["sessions"]:
+            try:
+                await session.send("Fetch.disable")
+                await session.detach()
+            except Exception:
+                pass  # страница уже закрыта
+        total = counters["hits"] + counters["misses"]
+        if total:
+            logger.info("Кэш ассетов ({}): из кэша {} из {} ({:.0f}%), {:.1f} МБ без сети",
+                        flow, counters["hits"], total, counters["hits"] / total * 100, counters["bytes"] / 1e6)
+        try:
+            await asyncio.to_thread(self.save)
+        except OSError as e:
+            logger.warning("Не удалось сохранить индекс кэша ассетов: {}", e)
+        metrics.publish("asset_cache", self.stats())
+
+
+_instance: Optional[AssetCache] = None
+_instance_lock = threading.Lock()
+
+
+def enable(max_bytes: int = ASSET_CACHE_MAX_BYTES) -> AssetCache:
+    """Включает кэш для процесса (индекс загружается из asset_cache/index.json)."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = AssetCache(max_bytes=max_bytes)
+            logger.info("Кэш статических ассетов включён: {} объектов, {:.1f} МБ (лимит {:.0f} МБ)",
+                        len(_instance._objects), _instance._total_bytes / 1e6, max_bytes / 1e6)
+        return _instance
+
+
+def get_asset_cache() -> Optional[AssetCache]:
+    """Кэш процесса или None, если он не включён."""
+    if _instance is None and ASSET_CACHE_ENABLED:
+        return enable()
+    return _instance
+
+
+async def attach(context) -> None:
+    """attach на кэш процесса; без включённого кэша ничего не делает."""
+    cache = get_asset_cache()
+    if cache is not None:
+        await cache.attach(context)
+
+
+async def detach(context, flow: str) -> None:
+    cache = get_asset_cache()
+    if cache is not None:
+        await cache.detach(context, flow)
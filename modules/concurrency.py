@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Адаптивное число параллельных запусков (AIMD) по нагрузке хоста и доле ошибок.
+
+Раз в CONTROL_INTERVAL_SEC контроллер смотрит:
+- load average за минуту на одно ядро (/proc/loadavg);
+- доступную память (MemAvailable из /proc/meminfo);
+- долю ошибок и таймаутов шагов среди последних запусков.
+При перегрузке лимит делится на DECREASE_FACTOR (multiplicative decrease), при запасе ресурсов и очереди
+«должных» аккаунтов — растёт на 1 (additive increase). Каждое решение с причиной и сигналами
+публикуется в метрики (раздел "concurrency"). Вне Linux сигналы /proc недоступны и не учитываются.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from loguru import logger
+
+from modules import metrics
+
+CONTROL_INTERVAL_SEC = 30.0
+# После снижения лимит не растёт это время — даём нагрузке успокоиться
+DECREASE_COOLDOWN_SEC = 120.0
+DECREASE_FACTOR = 0.5
+# Пороги перегрузки
+LOAD_PER_CPU_HIGH = 0.9
+MEM_AVAILABLE_MIN_MB = 1024
+FAILURE_RATE_HIGH = 0.3
+TIMEOUT_RATE_HIGH = 0.2
+# Для роста нужен запас: нагрузка ниже LOAD_PER_CPU_HIGH × это и память ещё на один браузер
+LOAD_HEADROOM = 0.7
+MEM_PER_RUN_MB = 700
+# Окно запусков для доли ошибок/таймаутов
+RUNS_WINDOW = 20
+RUNS_WINDOW_SEC = 15 * 60.0
+MIN_RUNS_FOR_RATES = 5
+DECISIONS_KEPT = 20
+
+PROC_LOADAVG = "/proc/loadavg"
+PROC_MEMINFO = "/proc/meminfo"
+
+
+def read_load_per_cpu() -> Optional[float]:
+    """Load average за 1 минуту, делённый на число ядер (None вне Linux)."""
+    try:
+        with open(PROC_LOADAVG, "r", encoding="ascii") as f:
+            load1 = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return load1 / (os.cpu_count() or 1)
+
+
+def read_mem_available_mb() -> Optional[float]:
+    """MemAvailable из /proc/meminfo в МБ (None вне Linux)."""
+    try:
+        with open(PROC_MEMINFO, "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except (OSError, ValueError, IndexError):
+        return None
+    return None
+
+
+class ConcurrencyController:
+    """AIMD-лимит параллельных запусков в пределах [min_limit, max_limit]. Вызывается из цикла мониторинга."""
+
+    def __init__(self, max_limit: int, min_limit: int = 1, start: Optional[int] = None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, start or self.min_limit))
+        self._runs: deque[tuple[float, bool, bool]] = deque(maxlen=RUNS_WINDOW)  # (time, ok, timed_out)
+        self._last_update = 0.0
+        self._last_decrease = float("-inf")
+        self.decisions: deque[dict[str, Any]] = deque(maxlen=DECISIONS_KEPT)
+
+    def record_run(self, ok: bool, timed_out: bool = False) -> None:
+        """Учитывает завершённый запуск (timed_out — упал по таймауту шага)."""
+        self._runs.append((time.monotonic(), ok, timed_out))
+
+    def _rates(self, now: float) -> tuple[Optional[float], Optional[float], int]:
+        recent = [r for r in self._runs if now - r[0] <= RUNS_WINDOW_SEC]
+        if len(recent) < MIN_RUNS_FOR_RATES:
+            return None, None, len(recent)
+        failures = sum(1 for _, ok, _ in recent if not ok)
+        timeouts = sum(1 for _, _, timed_out in recent if timed_out)
+        return failures / len(recent), timeouts / len(recent), len(recent)
+
+    def signals(self) -> dict[str, Any]:
+        now = time.monotonic()
+        failure_rate, timeout_rate, runs = self._rates(now)
+        load = read_load_per_cpu()
+        mem = read_mem_available_mb()
+        return {
+            "load_per_cpu": round(load, 2) if load is not None else None,
+            "mem_available_mb": round(mem) if mem is not None else None,
+            "failure_rate": round(failure_rate, 3) if failure_rate is not None else None,
+            "timeout_rate": round(timeout_rate, 3) if timeout_rate is not None else None,
+            "recent_runs": runs,
+        }
+
+    def update(self, running: int, backlog: bool) -> int:
+        """
+        Раз в CONTROL_INTERVAL_SEC пересчитывает лимит. running — сколько запусков идёт,
+        backlog — есть ли «должные» аккаунты, которые ждут свободного воркера. Возвращает текущий лимит.
+        """
+        now = time.monotonic()
+        if now - self._last_update < CONTROL_INTERVAL_SEC:
+            return self.limit
+        self._last_update = now
+        sig = self.signals()
+        overload = []
+        if sig["load_per_cpu"] is not None and sig["load_per_cpu"] > LOAD_PER_CPU_HIGH:
+            overload.append(f"load/cpu {sig['load_per_cpu']} > {LOAD_PER_CPU_HIGH}")
+        if sig["mem_available_mb"] is not None and sig["mem_available_mb"] < MEM_AVAILABLE_MIN_MB:
+            overload.append(f"MemAvailable {sig['mem_available_mb']} МБ < {MEM_AVAILABLE_MIN_MB}")
+        if sig["failure_rate"] is not None and sig["failure_rate"] > FAILURE_RATE_HIGH:
+            overload.append(f"ошибок {sig['failure_rate']:.0%} > {FAILURE_RATE_HIGH:.0%}")
+        if sig["timeout_rate"] is not None and sig["timeout_rate"] > TIMEOUT_RATE_HIGH:
+            overload.append(f"таймаутов {sig['timeout_rate']:.0%} > {TIMEOUT_RATE_HIGH:.0%}")
+
+        prev = self.limit
+        if overload:
+            action = "decrease"
+            reason = "; ".join(overload)
+            self.limit = max(self.min_limit, int(self.limit * DECREASE_FACTOR))
+            self._last_decrease = now
+            self._runs.clear()  # следующее решение — по запускам уже при новом лимите
+        elif now - self._last_decrease < DECREASE_COOLDOWN_SEC:
+            action, reason = "hold", "пауза после снижения"
+        elif not backlog:
+            action, reason = "hold", "нет очереди"
+        elif running < self.limit:
+            action, reason = "hold", "лимит не выбран полностью"
+        elif sig["load_per_cpu"] is not None and sig["load_per_cpu"] > LOAD_PER_CPU_HIGH * LOAD_HEADROOM:
+            action, reason = "hold", f"load/cpu {sig['load_per_cpu']} без запаса"
+        elif sig["mem_available_mb"] is not None and sig["mem_available_mb"] < MEM_AVAILABLE_MIN_MB + MEM_PER_RUN_MB:
+            action, reason = "hold", f"MemAvailable {sig['mem_available_mb']} МБ без запаса на ещё один браузер"
+        elif self.limit >= self.max_limit:
+            action, reason = "hold", f"достигнут максимум {self.max_limit}"
+        else:
+            action, reason = "increase", "есть очередь и запас ресурсов"
+            self.limit += 1
+
+        decision = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "action": action,
+            "limit": self.limit,
+            "previous": prev,
+            "running": running,
+            "backlog": backlog,
+            "reason": reason,
+            **sig,
+        }
+        if self.limit != prev:
+            self.decisions.append(decision)
+            logger.info("Параллельных запусков: {} → {} ({})", prev, self.limit, reason)
+        self.publish(decision)
+        return self.limit
+
+    def set_max(self, max_limit: int) -> None:
+        """Меняет верхнюю границу (команда управляющего сокета); текущий лимит при необходимости опускается."""
+        self.max_limit = max(self.min_limit, max_limit)
+        if self.limit > self.max_limit:
+            prev, self.limit = self.limit, self.max_limit
+            self.decisions.append({"at": datetime.now(timezone.utc).isoformat(), "action": "set",
+                                   "limit": self.limit, "previous": prev, "reason": "новый максимум"})
+            logger.info("Параллельных запусков: {} → {} (новый максимум)", prev, self.limit)
+        self.publish()
+
+    def publish(self, last: Optional[dict[str, Any]] = None) -> None:
+        metrics.publish(
+            "concurrency",
+            {
+                "limit": self.limit,
+                "min": self.min_limit,
+                "max": self.max_limit,
+                "last": last,
+                "changes": list(self.decisions),
+            },
+        )
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный управляющий сокет работающего мониторинга (Unix socket startalegm.sock).
+
+Протокол: одна строка JSON-запроса {"cmd": "...", "args": [...]} → одна строка JSON-ответа.
+Команды исполняет сам мониторинг (см. Monitor в modules/startalegm.py); сервер только принимает
+соединения в фоновом потоке. Клиент: `python main.py ctl <команда> [аргументы]`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CONTROL_SOCKET_PATH = PROJECT_ROOT / "startalegm.sock"
+CONTROL_TIMEOUT_SEC = 10.0
+MAX_REQUEST_BYTES = 64 * 1024
+
+COMMANDS = ("pause", "resume", "drain", "run", "concurrency", "state")
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def _read_line(conn: socket.socket) -> bytes:
+    buf = b""
+    while b"\n" not in buf and len(buf) < MAX_REQUEST_BYTES:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        buf += chunk
+    return buf.split(b"\n", 1)[0]
+
+
+class ControlServer:
+    """Принимает команды на Unix-сокете и передаёт их handler(cmd, args) -> dict."""
+
+    def __init__(self, handler: Callable[[str, list[str]], dict[str, Any]], path: Path = CONTROL_SOCKET_PATH):
+        self.handler = handler
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Создаёт сокет (права 0600) и поток приёма. False — Unix-сокеты недоступны, сокет занят или не создаётся."""
+        if not supported():
+            logger.info("Управляющий сокет недоступен на этой платформе")
+            return False
+        if self.path.exists():
+            try:
+                send_command("state", path=self.path, timeout=1.0)
+                logger.warning("Управляющий сокет {} занят другим процессом мониторинга", self.path.name)
+                return False
+            except OSError:
+                try:
+                    self.path.unlink()  # остался от упавшего процесса
+                except OSError:
+                    pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(str(self.path))
+            os.chmod(self.path, 0o600)
+            sock.listen(8)
+        except OSError as e:
+            # Длинный путь к проекту (AF_UNIX path too long), ФС без сокетов и т.п.: мониторинг работает без сокета
+            sock.close()
+            logger.warning("Управляющий сокет {} не создан, управление недоступно: {}", self.path, e)
+            return False
+        self._sock = sock
+        self._thread = threading.Thread(target=self._serve, name="control-socket", daemon=True)
+        self._thread.start()
+        logger.info("Управляющий сокет: {} (python main.py ctl state)", self.path.name)
+        return True
+
+    def _serve(self) -> None:
+        while self._sock is not None:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return  # сокет закрыт
+            with conn:
+                conn.settimeout(CONTROL_TIMEOUT_SEC)
+                try:
+                    request = json.loads(_read_line(conn) or b"{}")
+                    cmd = str(request.get("cmd") or "")
+                    args = [str(a) for a in request.get("args") or []]
+                    if cmd not in COMMANDS:
+                        response = {"ok": False, "error": f"неизвестная команда: {cmd or '-'}", "commands": COMMANDS}
+                    else:
+                        response = self.handler(cmd, args)
+                except (ValueError, AttributeError) as e:
+                    response = {"ok": False, "error": f"неверный запрос: {e}"}
+                except Exception as e:
+                    response = {"ok": False, "error": str(e)}
+                try:
+                    conn.sendall(json.dumps(response, ensure_ascii=False, default=str).encode("utf-8") + b"\n")
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        sock, self._sock = self._sock, None
+        if sock is None:
+            return
+        sock.close()
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def send_command(
+    cmd: str, args: Optional[list[str]] = None, path: Path = CONTROL_SOCKET_PATH, timeout: float = CONTROL_TIMEOUT_SEC
+) -> dict[str, Any]:
+    """Отправляет команду работающему мониторингу и возвращает ответ. OSError — мониторинг не запущен."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path))
+        sock.sendall(json.dumps({"cmd": cmd, "args": args or []}).encode("utf-8") + b"\n")
+        line = _read_line(sock)
+    return json.loads(line) if line else {"ok": False, "error": "пустой ответ"}
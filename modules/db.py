@@ -8,12 +8,15 @@
 from __future__ import annotations
 
 import json
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any, Optional
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 JSON_PATH = PROJECT_ROOT / "startalegm.json"
+# Запуски аккаунтов идут в нескольких потоках: чтение-изменение-запись файла под одной блокировкой
+_lock = threading.RLock()
 
 
 def _read_data() -> dict[str, Any]:
@@ -51,6 +54,15 @@ def upsert_account(
     smart_account_created: Optional[bool] = None,
 ) -> None:
     """Вставляет или обновляет запись по EOA. Переданные None не обновляют поле."""
+    with _lock:
+        _upsert_account_locked(eoa_address, next_gm_available_at, smart_account_created)
+
+
+def _upsert_account_locked(
+    eoa_address: str,
+    next_gm_available_at: Optional[datetime],
+    smart_account_created: Optional[bool],
+) -> None:
     init_db()
     data = _read_data()
     accounts = data.setdefault("accounts", {})
@@ -73,8 +85,9 @@ def upsert_account(
 
 def get_account_info(eoa_address: str) -> Optional[dict]:
     """Возвращает запись по адресу или None."""
-    init_db()
-    data = _read_data()
+    with _lock:
+        init_db()
+        data = _read_data()
     accounts = data.get("accounts", {})
     if eoa_address not in accounts:
         return None
@@ -86,8 +99,9 @@ def get_account_info(eoa_address: str) -> Optional[dict]:
 
 def get_all_addresses() -> list[str]:
     """Список всех EOA-адресов в хранилище."""
-    init_db()
-    data = _read_data()
+    with _lock:
+        init_db()
+        data = _read_data()
     return list(data.get("accounts", {}).keys())
 
 
@@ -97,8 +111,9 @@ def get_accounts_due_for_gm(known_addresses: list[str]) -> list[str]:
     - есть в known_addresses;
     - при этом либо нет в хранилище, либо next_gm_available_at отсутствует/null, либо next_gm_available_at <= now (UTC).
     """
-    init_db()
-    data = _read_data()
+    with _lock:
+        init_db()
+        data = _read_data()
     accounts = data.get("accounts", {})
     now_utc = datetime.now(timezone.utc)
     due = []
@@ -118,3 +133,31 @@ def get_accounts_due_for_gm(known_addresses: list[str]) -> list[str]:
         except (ValueError, TypeError):
             due.append(addr)
     return due
+
+
+def get_next_gm_times(known_addresses: list[str]) -> dict[str, Optional[datetime]]:
+    """
+    Время следующего GM для каждого адреса за одно чтение файла (для загрузки расписания в планировщик).
+    None — адреса нет в хранилище, время не задано или не парсится (такой аккаунт считается «должным»).
+    """
+    with _lock:
+        init_db()
+        data = _read_data()
+    accounts = data.get("accounts", {})
+    result: dict[str, Optional[datetime]] = {}
+    for addr in known_addresses:
+        next_at_str = (accounts.get(addr) or {}).get("next_gm_available_at")
+        try:
+            result[addr] = datetime.fromisoformat(next_at_str.replace("Z", "+00:00")) if next_at_str else None
+        except (ValueError, TypeError, AttributeError):
+            result[addr] = None
+    return result
+
+
+def get_smart_account_flags(known_addresses: list[str]) -> dict[str, bool]:
+    """Признак созданного смарт-аккаунта для каждого адреса за одно чтение файла (подбор пакета в мониторинге)."""
+    with _lock:
+        init_db()
+        data = _read_data()
+    accounts = data.get("accounts", {})
+    return {addr: bool((accounts.get(addr) or {}).get("smart_account_created", False)) for addr in known_addresses}
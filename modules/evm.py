@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Минимальные примитивы EVM без web3: keccak-256, приватный ключ → адрес (secp256k1), EIP-55 checksum.
+Нужны, чтобы не импортировать web3 (несколько секунд на холодном старте) ради двух вызовов.
+Умножение на генератор идёт по заранее посчитанной таблице окон, поэтому вывод адреса занимает доли миллисекунды.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Optional
+
+# --- keccak-256 (оригинальный Keccak, не NIST SHA3: паддинг 0x01) ---
+
+_KECCAK_RC = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+_KECCAK_ROT = (
+    (0, 36, 3, 41, 18),
+    (1, 44, 10, 45, 2),
+    (62, 6, 43, 15, 61),
+    (28, 55, 25, 21, 56),
+    (27, 20, 39, 8, 14),
+)
+_MASK64 = (1 << 64) - 1
+_KECCAK_RATE = 136  # байт, для 256-битного выхода
+
+
+def _rol64(v: int, n: int) -> int:
+    return ((v << n) | (v >> (64 - n))) & _MASK64 if n else v
+
+
+def _keccak_f(a: list[list[int]]) -> None:
+    """Перестановка Keccak-f[1600] над состоянием a[x][y] (in-place)."""
+    for rc in _KECCAK_RC:
+        c = [a[x][0] ^ a[x][1] ^ a[x][2] ^ a[x][3] ^ a[x][4] for x in range(5)]
+        d = [c[(x - 1) % 5] ^ _rol64(c[(x + 1) % 5], 1) for x in range(5)]
+        for x in range(5):
+            dx = d[x]
+            col = a[x]
+            for y in range(5):
+                col[y] ^= dx
+        b = [[0] * 5 for _ in range(5)]
+        for x in range(5):
+            for y in range(5):
+                b[y][(2 * x + 3 * y) % 5] = _rol64(a[x][y], _KECCAK_ROT[x][y])
+        for x in range(5):
+            for y in range(5):
+                a[x][y] = b[x][y] ^ ((~b[(x + 1) % 5][y]) & b[(x + 2) % 5][y])
+        a[0][0] ^= rc
+
+
+def _keccak256_py(data: bytes) -> bytes:
+    """Чистый Python Keccak-256 — запасной вариант, если pycryptodome не установлен."""
+    padded = bytearray(data)
+    padded.append(0x01)
+    while len(padded) % _KECCAK_RATE:
+        padded.append(0)
+    padded[-1] |= 0x80
+    state = [[0] * 5 for _ in range(5)]
+    for off in range(0, len(padded), _KECCAK_RATE):
+        block = padded[off:off + _KECCAK_RATE]
+        for i in range(_KECCAK_RATE // 8):
+            lane = int.from_bytes(block[8 * i:8 * i + 8], "little")
+            state[i % 5][i // 5] ^= lane
+        _keccak_f(state)
+    out = b"".join(state[i % 5][i // 5].to_bytes(8, "little") for i in range(4))
+    return out
+
+
+@lru_cache(maxsize=1)
+def _keccak_backend():
+    # pycryptodome (есть в requirements.txt) импортируется за миллисекунды; C-реализация в ~100 раз быстрее.
+    # Без него — чистый Python ниже
+    try:
+        from Crypto.Hash import keccak
+    except ImportError:
+        return None
+    return keccak
+
+
+def keccak256(data: bytes) -> bytes:
+    """Keccak-256, как в Ethereum (hashlib.sha3_256 отличается паддингом и здесь не подходит)."""
+    backend = _keccak_backend()
+    if backend is None:
+        return _keccak256_py(data)
+    return backend.new(data=data, digest_bits=256).digest()
+
+
+# --- secp256k1 ---
+
+_P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_GX = 0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798
+_GY = 0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8
+_WINDOW_BITS = 4
+
+# Точки в якобиевых координатах (X, Y, Z); бесконечность — Z == 0
+_INF = (0, 1, 0)
+
+
+def _jac_double(p: tuple[int, int, int]) -> tuple[int, int, int]:
+    x, y, z = p
+    if not z or not y:
+        return _INF
+    ysq = y * y % _P
+    s = 4 * x * ysq % _P
+    m = 3 * x * x % _P  # a = 0 у secp256k1
+    nx = (m * m - 2 * s) % _P
+    ny = (m * (s - nx) - 8 * ysq * ysq) % _P
+    nz = 2 * y * z % _P
+    return nx, ny, nz
+
+
+def _jac_add(p: tuple[int, int, int], q: tuple[int, int, int]) -> tuple[int, int, int]:
+    if not p[2]:
+        return q
+    if not q[2]:
+        return p
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    z1sq = z1 * z1 % _P
+    z2sq = z2 * z2 % _P
+    u1 = x1 * z2sq % _P
+    u2 = x2 * z1sq % _P
+    s1 = y1 * z2sq * z2 % _P
+    s2 = y2 * z1sq * z1 % _P
+    if u1 == u2:
+        return _jac_double(p) if s1 == s2 else _INF
+    h = (u2 - u1) % _P
+    r = (s2 - s1) % _P
+    hsq = h * h % _P
+    hcu = hsq * h % _P
+    u1hsq = u1 * hsq % _P
+    nx = (r * r - hcu - 2 * u1hsq) % _P
+    ny = (r * (u1hsq - nx) - s1 * hcu) % _P
+    nz = h * z1 * z2 % _P
+    return nx, ny, nz
+
+
+def _jac_add_affine(p: tuple[int, int, int], q: tuple[int, int]) -> tuple[int, int, int]:
+    """p + q, где q в аффинных координатах (Z = 1): на четыре умножения дешевле общего сложения."""
+    if not p[2]:
+        return q[0], q[1], 1
+    x1, y1, z1 = p
+    x2, y2 = q
+    z1sq = z1 * z1 % _P
+    u2 = x2 * z1sq % _P
+    s2 = y2 * z1sq * z1 % _P
+    if x1 == u2:
+        return _jac_double(p) if y1 == s2 else _INF
+    h = (u2 - x1) % _P
+    r = (s2 - y1) % _P
+    hsq = h * h % _P
+    hcu = hsq * h % _P
+    x1hsq = x1 * hsq % _P
+    nx = (r * r - hcu - 2 * x1hsq) % _P
+    ny = (r * (x1hsq - nx) - y1 * hcu) % _P
+    nz = h * z1 % _P
+    return nx, ny, nz
+
+
+def _to_affine_batch(points: list[tuple[int, int, int]]) -> list[tuple[int, int]]:
+    """Перевод в аффинные координаты с одной инверсией на всю пачку (трюк Монтгомери)."""
+    prefix = []
+    acc = 1
+    for _, _, z in points:
+        prefix.append(acc)
+        acc = acc * z % _P
+    inv = pow(acc, -1, _P)
+    result: list[tuple[int, int]] = [(0, 0)] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        x, y, z = points[i]
+        zinv = inv * prefix[i] % _P
+        inv = inv * z % _P
+        zinv2 = zinv * zinv % _P
+        result[i] = (x * zinv2 % _P, y * zinv2 * zinv % _P)
+    return result
+
+
+@lru_cache(maxsize=1)
+def _g_table() -> list[list[tuple[int, int]]]:
+    """table[i][d - 1] = d * 16^i * G в аффинных координатах; считается один раз на процесс."""
+    rows = []
+    base = (_GX, _GY, 1)
+    for _ in range(256 // _WINDOW_BITS):
+        row = []
+        acc = _INF
+        for _ in range((1 << _WINDOW_BITS) - 1):
+            acc = _jac_add(acc, base)
+            row.append(acc)
+        rows.append(row)
+        for _ in range(_WINDOW_BITS):
+            base = _jac_double(base)
+    width = (1 << _WINDOW_BITS) - 1
+    flat = _to_affine_batch([pt for row in rows for pt in row])
+    return [flat[i:i + width] for i in range(0, len(flat), width)]
+
+
+def _mul_g(k: int) -> tuple[int, int]:
+    """k * G в аффинных координатах."""
+    table = _g_table()
+    acc = _INF
+    i = 0
+    mask = (1 << _WINDOW_BITS) - 1
+    while k:
+        digit = k & mask
+        if digit:
+            acc = _jac_add_affine(acc, table[i][digit - 1])
+        k >>= _WINDOW_BITS
+        i += 1
+    x, y, z = acc
+    zinv = pow(z, -1, _P)
+    zinv2 = zinv * zinv % _P
+    return x * zinv2 % _P, y * zinv2 * zinv % _P
+
+
+# --- адреса ---
+
+_HEX_ADDRESS_RE = re.compile(r"^(0x)?[0-9a-fA-F]{40}$")
+
+
+def to_checksum_address(address: str) -> str:
+    """Адрес в формате EIP-55 (аналог Web3.to_checksum_address для hex-строки)."""
+    if not isinstance(address, str) or not _HEX_ADDRESS_RE.match(address):
+        raise ValueError(f"Некорректный адрес: {address!r}")
+    addr = address.lower().removeprefix("0x")
+    digest = keccak256(addr.encode("ascii")).hex()
+    return "0x" + "".join(c.upper() if int(digest[i], 16) >= 8 else c for i, c in enumerate(addr))
+
+
+def private_key_to_address(private_key: str) -> str:
+    """
+    Checksum-адрес EOA для приватного ключа (hex, с 0x или без). Результат не кэшируется, чтобы ключи
+    не оставались в памяти процесса; соответствие ключ → адрес держит реестр мониторинга (modules/registry.py).
+    """
+    pk_hex = private_key.removeprefix("0x")
+    k = int(pk_hex, 16)
+    if not 0 < k < _N:
+        raise ValueError("Приватный ключ вне диапазона secp256k1")
+    x, y = _mul_g(k)
+    pub = x.to_bytes(32, "big") + y.to_bytes(32, "big")
+    return to_checksum_address(keccak256(pub)[-20:].hex())
+
+
+def try_private_key_to_address(private_key: str) -> Optional[str]:
+    """Как private_key_to_address, но None вместо исключения для некорректного ключа."""
+    try:
+        return private_key_to_address(private_key)
+    except ValueError:
+        return None
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Журнал запусков StartaleGM в JSONL (append-only): одна строка на каждую попытку запуска аккаунта.
+По журналу строится отчёт: отставание от расписания, аккаунтов в час, доля ошибок.
+Файл читается потоково, поэтому отчёт не зависит от объёма истории; старые записи убирает compact().
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса
+    fcntl = None
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+HISTORY_PATH = PROJECT_ROOT / "run_history.jsonl"
+# Замок между процессами: мониторинг дописывает журнал, а `main.py compact` в отдельном процессе его перезаписывает
+HISTORY_LOCK_PATH = PROJECT_ROOT / "run_history.jsonl.lock"
+
+OUTCOME_OK = "ok"            # GM отправлен или время следующего GM сдвинулось вперёд
+OUTCOME_NO_GM = "no_gm"      # сценарий прошёл без исключений, но расписание не сдвинулось
+OUTCOME_FAILED = "failed"    # исключение в одном из шагов (см. failed_step)
+OUTCOME_INTERRUPTED = "interrupted"  # Ctrl+C во время запуска
+
+_lock = threading.Lock()
+
+
+@contextmanager
+def _locked() -> Iterator[None]:
+    """Блокировка журнала: между потоками (_lock) и между процессами (flock на HISTORY_LOCK_PATH)."""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(HISTORY_LOCK_PATH, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _parse_dt(value: Any) -> Optional[datetime]:
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def append_run(record: dict[str, Any]) -> None:
+    """Дописывает запись о запуске в конец журнала (одна JSON-строка)."""
+    line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+    with _locked():
+        with open(HISTORY_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def iter_runs(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    path: Optional[Path] = None,
+) -> Iterator[dict[str, Any]]:
+    """
+    Потоково отдаёт записи журнала с started_at в [since, until).
+    Битые строки (например, недописанная последняя строка после падения) пропускаются.
+    """
+    path = path or HISTORY_PATH
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except (json.JSONDecodeError, ValueError):
+                continue
+            if not isinstance(rec, dict):
+                continue
+            if since is not None or until is not None:
+                started = _parse_dt(rec.get("started_at"))
+                if started is None:
+                    continue
+                if since is not None and started < since:
+                    continue
+                if until is not None and started >= until:
+                    continue
+            yield rec
+
+
+def compact(keep_days: int) -> tuple[int, int]:
+    """
+    Удаляет из журнала записи старше keep_days дней. Файл перезаписывается атомарно (tmp + replace)
+    под блокировкой журнала, так что записи работающего мониторинга не теряются. Возвращает (оставлено, удалено).
+    """
+    if not HISTORY_PATH.exists():
+        return 0, 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=keep_days)
+    tmp_path = HISTORY_PATH.with_name(HISTORY_PATH.name + ".tmp")
+    kept = dropped = 0
+    with _locked():
+        with open(HISTORY_PATH, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    dropped += 1
+                    continue
+                started = _parse_dt(rec.get("started_at")) if isinstance(rec, dict) else None
+                if started is None or started < cutoff:
+                    dropped += 1
+                    continue
+                dst.write(line + "\n")
+                kept += 1
+        os.replace(tmp_path, HISTORY_PATH)
+    return kept, dropped
+
+
+def _percentile(sorted_values: list[float], pct: float) -> Optional[float]:
+    """Перцентиль по методу nearest-rank; sorted_values должен быть отсортирован."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def build_report(since: datetime, until: datetime) -> dict[str, Any]:
+    """
+    Считает статистику по окну [since, until):
+    - отставание старта от next_gm_available_at (p50/p90/p99/max, секунды);
+    - отставание нажатия "Send GM back" (gm_at) от next_gm_available_at — то, что видит расписание сайта;
+    - длительность запуска (p50/p90/p99);
+    - аккаунтов в час (успешных запусков / длительность окна);
+    - доли исходов и ошибки по шагам.
+    """
+    lags: list[float] = []
+    gm_lags: list[float] = []
+    durations: list[float] = []
+    outcomes: dict[str, int] = {}
+    failed_steps: dict[str, int] = {}
+    total = 0
+    for rec in iter_runs(since=since, until=until):
+        total += 1
+        outcome = rec.get("outcome") or "unknown"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if outcome == OUTCOME_FAILED:
+            step = rec.get("failed_step") or "unknown"
+            failed_steps[step] = failed_steps.get(step, 0) + 1
+        started = _parse_dt(rec.get("started_at"))
+        due = _parse_dt(rec.get("due_at"))
+        if started and due:
+            lags.append(max(0.0, (started - due).total_seconds()))
+        gm_at = _parse_dt(rec.get("gm_at"))
+        if gm_at and due:
+            gm_lags.append(max(0.0, (gm_at - due).total_seconds()))
+        duration = rec.get("duration_sec")
+        if isinstance(duration, (int, float)):
+            durations.append(float(duration))
+    lags.sort()
+    gm_lags.sort()
+    durations.sort()
+    window_hours = max((until - since).total_seconds() / 3600.0, 1e-9)
+    ok = outcomes.get(OUTCOME_OK, 0)
+    failed = outcomes.get(OUTCOME_FAILED, 0)
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "runs": total,
+        "outcomes": outcomes,
+        "failed_steps": failed_steps,
+        "failure_rate": (failed / total) if total else 0.0,
+        "accounts_per_hour": ok / window_hours,
+        "lag_sec": {
+            "count": len(lags),
+            "p50": _percentile(lags, 50),
+            "p90": _percentile(lags, 90),
+            "p99": _percentile(lags, 99),
+            "max": lags[-1] if lags else None,
+        },
+        "gm_lag_sec": {
+            "count": len(gm_lags),
+            "p50": _percentile(gm_lags, 50),
+            "p90": _percentile(gm_lags, 90),
+            "p99": _percentile(gm_lags, 99),
+            "max": gm_lags[-1] if gm_lags else None,
+        },
+        "duration_sec": {
+            "count": len(durations),
+            "p50": _percentile(durations, 50),
+            "p90": _percentile(durations, 90),
+            "p99": _percentile(durations, 99),
+        },
+    }
+
+
+def _fmt_sec(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value:.1f} с"
+
+
+def format_report(report: dict[str, Any]) -> str:
+    """Человекочитаемый вид отчёта build_report()."""
+    lag = report["lag_sec"]
+    gm_lag = report.get("gm_lag_sec") or {"count": 0}
+    dur = report["duration_sec"]
+    lines = [
+        f"Окно: {report['since']} — {report['until']}",
+        f"Запусков: {report['runs']}, аккаунтов в час: {report['accounts_per_hour']:.2f}, "
+        f"доля ошибок: {report['failure_rate'] * 100:.1f}%",
+        "Исходы: " + (", ".join(f"{k}={v}" for k, v in sorted(report["outcomes"].items())) or "—"),
+        f"Отставание от расписания ({lag['count']}): p50 {_fmt_sec(lag['p50'])}, p90 {_fmt_sec(lag['p90'])}, "
+        f"p99 {_fmt_sec(lag['p99'])}, max {_fmt_sec(lag['max'])}",
+    ]
+    if gm_lag["count"]:
+        lines.append(
+            f"Отставание нажатия GM ({gm_lag['count']}): p50 {_fmt_sec(gm_lag['p50'])}, p90 {_fmt_sec(gm_lag['p90'])}, "
+            f"p99 {_fmt_sec(gm_lag['p99'])}, max {_fmt_sec(gm_lag['max'])}"
+        )
+    lines += [
+        f"Длительность запуска ({dur['count']}): p50 {_fmt_sec(dur['p50'])}, p90 {_fmt_sec(dur['p90'])}, "
+        f"p99 {_fmt_sec(dur['p99'])}",
+    ]
+    if report["failed_steps"]:
+        steps = sorted(report["failed_steps"].items(), key=lambda kv: -kv[1])
+        lines.append("Ошибки по шагам: " + ", ".join(f"{k}={v}" for k, v in steps))
+    return "\n".join(lines)
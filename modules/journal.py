@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Журнал незавершённых запусков (inflight.json): какой аккаунт сейчас обрабатывается, в каком профиле AdsPower
+и какая фаза последней завершилась. Пишется перед созданием профиля и обновляется на каждой крупной фазе,
+удаляется после остановки браузера и удаления профиля. Если мониторинг упал посреди запуска, при старте
+по журналу можно переподключиться к ещё живому браузеру или убрать брошенный профиль.
+Запись атомарная (tmp + replace), чтобы падение во время записи не портило файл.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+JOURNAL_PATH = PROJECT_ROOT / "inflight.json"
+
+# Фазы в порядке выполнения; в записи хранится последняя завершённая
+PHASE_STARTED = "started"
+PHASE_PROFILE_CREATED = "profile_created"
+PHASE_BROWSER_STARTED = "browser_started"
+PHASE_WALLET_IMPORTED = "wallet_imported"
+PHASES = (PHASE_STARTED, PHASE_PROFILE_CREATED, PHASE_BROWSER_STARTED, PHASE_WALLET_IMPORTED)
+
+_lock = threading.Lock()
+
+
+def _read() -> dict[str, Any]:
+    if not JOURNAL_PATH.exists():
+        return {"runs": {}}
+    try:
+        with open(JOURNAL_PATH, "r", encoding="utf-8") as f:
+            raw = f.read().strip()
+        if not raw:
+            return {"runs": {}}
+        data = json.loads(raw)
+        if not isinstance(data, dict) or not isinstance(data.get("runs"), dict):
+            return {"runs": {}}
+        return data
+    except (json.JSONDecodeError, ValueError):
+        return {"runs": {}}
+
+
+def _write(data: dict[str, Any]) -> None:
+    tmp_path = JOURNAL_PATH.with_name(JOURNAL_PATH.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, JOURNAL_PATH)
+
+
+def _now_utc() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def begin(eoa_address: str, key_index: int) -> None:
+    """Отмечает начало запуска аккаунта (до create_temp_profile)."""
+    with _lock:
+        data = _read()
+        data["runs"][eoa_address] = {
+            "key_index": key_index,
+            "profile_id": None,
+            "cdp_endpoint": None,
+            "phase": PHASE_STARTED,
+            "started_at": _now_utc(),
+            "updated_at": _now_utc(),
+        }
+        _write(data)
+
+
+def update(eoa_address: str, phase: str, **fields: Any) -> None:
+    """Записывает завершённую фазу и связанные поля (profile_id, cdp_endpoint)."""
+    with _lock:
+        data = _read()
+        rec = data["runs"].setdefault(eoa_address, {"started_at": _now_utc()})
+        rec.update(fields)
+        rec["phase"] = phase
+        rec["updated_at"] = _now_utc()
+        _write(data)
+
+
+def finish(eoa_address: str) -> None:
+    """Удаляет запись после того, как профиль остановлен и удалён."""
+    with _lock:
+        data = _read()
+        if data["runs"].pop(eoa_address, None) is not None:
+            _write(data)
+
+
+def load_inflight() -> list[dict[str, Any]]:
+    """Все незавершённые запуски (обычно остаются только после аварийного завершения процесса)."""
+    with _lock:
+        runs = _read()["runs"]
+    result = []
+    for addr, rec in runs.items():
+        rec = dict(rec)
+        rec["eoa_address"] = addr
+        result.append(rec)
+    return result
+
+
+def phase_reached(entry: dict[str, Any], phase: str) -> bool:
+    """True, если в записи завершена фаза phase (или более поздняя)."""
+    current = entry.get("phase")
+    if current not in PHASES:
+        return False
+    return PHASES.index(current) >= PHASES.index(phase)
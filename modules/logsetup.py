@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Настройка логов loguru: неблокирующие sink'и (enqueue=True — запись в фоновом потоке, а не в горячем пути),
+контекст запуска на каждой строке (address, run_id, step через logger.contextualize) и JSON-файл
+с ротацией по размеру и сжатием.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+from loguru import logger
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+LOGS_DIR = PROJECT_ROOT / "logs"
+JSON_LOG_PATH = LOGS_DIR / "startalegm.jsonl"
+LOG_ROTATION = "20 MB"
+LOG_RETENTION = 10  # сколько сжатых файлов ротации хранить
+LOG_LEVEL = "INFO"
+
+CONSOLE_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
+    "<cyan>{extra[run_id]}</cyan> {extra[address]} {extra[step]} | <level>{message}</level>"
+)
+# Значения по умолчанию для строк вне запуска аккаунта
+DEFAULT_EXTRA = {"address": "-", "run_id": "-", "step": "-"}
+
+
+def setup_logging(json_file: bool = True) -> None:
+    """Консоль (stderr) + JSON-файл logs/startalegm.jsonl; оба sink'а через очередь (enqueue)."""
+    logger.remove()
+    logger.configure(extra=DEFAULT_EXTRA)
+    logger.add(sys.stderr, format=CONSOLE_FORMAT, level=LOG_LEVEL, enqueue=True, colorize=sys.stderr.isatty())
+    if json_file:
+        LOGS_DIR.mkdir(exist_ok=True)
+        logger.add(
+            JSON_LOG_PATH,
+            level=LOG_LEVEL,
+            serialize=True,
+            enqueue=True,
+            rotation=LOG_ROTATION,
+            retention=LOG_RETENTION,
+            compression="gz",
+            encoding="utf-8",
+        )
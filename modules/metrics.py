@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Метрики работающего мониторинга: разделы (прокси, планировщик и т.д.) собираются в памяти
+и периодически сбрасываются в metrics.json (атомарно). Смотреть: `python main.py metrics`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+METRICS_PATH = PROJECT_ROOT / "metrics.json"
+# Не чаще одного сброса на диск за этот интервал (кроме flush())
+METRICS_WRITE_INTERVAL_SEC = 5.0
+
+_lock = threading.Lock()
+_sections: dict[str, Any] = {}
+_last_write = 0.0
+
+
+def publish(section: str, data: Any) -> None:
+    """Обновляет раздел метрик; файл перезаписывается не чаще METRICS_WRITE_INTERVAL_SEC."""
+    with _lock:
+        _sections[section] = data
+        due = time.monotonic() - _last_write >= METRICS_WRITE_INTERVAL_SEC
+    if due:
+        flush()
+
+
+def snapshot() -> dict[str, Any]:
+    """Копия текущих метрик процесса."""
+    with _lock:
+        return {"updated_at": datetime.now(timezone.utc).isoformat(), "pid": os.getpid(), **_sections}
+
+
+def flush() -> None:
+    """Сразу записывает метрики в metrics.json."""
+    global _last_write
+    data = snapshot()
+    tmp_path = METRICS_PATH.with_name(METRICS_PATH.name + ".tmp")
+    with _lock:
+        _last_write = time.monotonic()
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            os.replace(tmp_path, METRICS_PATH)
+        except OSError:
+            pass
+
+
+def read_file() -> dict[str, Any]:
+    """Метрики, записанные работающим процессом (пустой dict, если файла нет или он битый)."""
+    if not METRICS_PATH.exists():
+        return {}
+    try:
+        with open(METRICS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, ValueError, OSError):
+        return {}
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Шаги запуска и трейсы производительности.
+
+RunTrace всегда (дёшево) записывает шаги сценария: имя, вид (навигация, ожидание селектора, popup, пауза),
+начало и длительность. Для выбранных запусков (адрес в trace_accounts.txt или случайная выборка
+TRACE_SAMPLE_RATE) дополнительно пишется Playwright trace (zip, открывается `playwright show-trace`),
+считается время с запросами «в полёте» и сохраняется компактная сводка-водопад.
+Каталог traces/ — кольцевой: при превышении TRACES_MAX_BYTES удаляются самые старые файлы.
+Шаги с потолком таймаута получают адаптивный таймаут из modules/timeouts.py и пополняют его статистику.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from loguru import logger
+
+from modules.timeouts import get_step_timeouts
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+TRACES_DIR = PROJECT_ROOT / "traces"
+# По одному EOA-адресу на строку: для этих аккаунтов трейс пишется на каждом запуске
+TRACE_ACCOUNTS_FILE = PROJECT_ROOT / "trace_accounts.txt"
+# Доля остальных запусков, для которых пишется трейс (0 — только аккаунты из trace_accounts.txt)
+TRACE_SAMPLE_RATE = 0.0
+# Предел размера каталога traces/ (трейсы + сводки)
+TRACES_MAX_BYTES = 500 * 1024 * 1024
+WATERFALL_WIDTH = 40
+
+KIND_NAVIGATION = "navigation"
+KIND_SELECTOR = "selector"
+KIND_POPUP = "popup"
+KIND_SLEEP = "sleep"
+KIND_API = "api"
+KINDS = (KIND_NAVIGATION, KIND_SELECTOR, KIND_POPUP, KIND_SLEEP, KIND_API)
+
+_ring_lock = threading.Lock()
+
+
+def _load_trace_accounts() -> set[str]:
+    if not TRACE_ACCOUNTS_FILE.exists():
+        return set()
+    with open(TRACE_ACCOUNTS_FILE, "r", encoding="utf-8") as f:
+        return {line.strip().lower() for line in f if line.strip() and not line.startswith("#")}
+
+
+def should_capture(eoa_address: str) -> bool:
+    """Писать ли полный трейс для этого запуска: адрес в trace_accounts.txt или попадание в выборку."""
+    if eoa_address.lower() in _load_trace_accounts():
+        return True
+    return TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+
+
+def _union_seconds(intervals: list[tuple[float, float]]) -> float:
+    """Суммарная длина объединения интервалов (время, когда был хотя бы один запрос в полёте)."""
+    total = 0.0
+    cur_start = cur_end = None
+    for start, end in sorted(intervals):
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+
+def enforce_ring_limit(max_bytes: int = TRACES_MAX_BYTES) -> None:
+    """Удаляет самые старые файлы из traces/, пока суммарный размер больше max_bytes."""
+    with _ring_lock:
+        if not TRACES_DIR.exists():
+            return
+        files = []
+        for p in TRACES_DIR.iterdir():
+            if p.is_file():
+                st = p.stat()
+                files.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in files)
+        for _, size, p in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                continue
+
+
+class StepSpan:
+    """Один шаг сценария. Заполняется при выходе из RunTrace.step()."""
+
+    __slots__ = ("name", "kind", "start", "duration", "ok", "timeout_ms")
+
+    def __init__(self, name: str, kind: str, start: float, timeout_ms: Optional[int] = None):
+        self.name = name
+        self.kind = kind
+        self.start = start
+        self.duration: Optional[float] = None
+        self.ok = True
+        # Таймаут для ожиданий внутри шага (мс); None — шаг без ожиданий Playwright
+        self.timeout_ms = timeout_ms
+
+
+class RunTrace:
+    """Шаги одного запуска аккаунта; при capture=True — ещё Playwright trace и сводка в traces/."""
+
+    def __init__(self, run_id: str, eoa_address: str, capture: bool = False):
+        self.run_id = run_id
+        self.eoa_address = eoa_address
+        self.capture = capture
+        self.t0 = time.monotonic()
+        self.spans: list[StepSpan] = []
+        self.trace_files: list[str] = []
+        self._requests: dict[int, float] = {}
+        self._request_intervals: list[tuple[float, float]] = []
+        self._request_count = 0
+        self._failed_requests = 0
+        self.timeouts = get_step_timeouts()
+
+    @contextmanager
+    def step(self, name: str, kind: str, timeout_ms: Optional[int] = None) -> Iterator[StepSpan]:
+        """
+        Замеряет шаг: `with trace.step("login.goto", KIND_NAVIGATION, 60000) as st: await page.goto(..., timeout=st.timeout_ms)`.
+        timeout_ms — потолок таймаута шага; st.timeout_ms — адаптивное значение в его пределах.
+        """
+        adaptive = self.timeouts.timeout_ms(name, timeout_ms) if timeout_ms is not None else None
+        span = StepSpan(name, kind, time.monotonic(), adaptive)
+        self.spans.append(span)
+        try:
+            with logger.contextualize(step=name):
+                yield span
+        except BaseException:
+            span.ok = False
+            raise
+        finally:
+            span.duration = time.monotonic() - span.start
+            if adaptive is not None:
+                if span.ok:
+                    self.timeouts.observe(name, span.duration * 1000)
+                elif adaptive < timeout_ms and span.duration * 1000 >= adaptive:
+                    # Упали по сниженному таймауту: не замер (зависания не должны поднимать p99),
+                    # а счётчик подряд — он даёт ограниченный запас следующим попыткам
+                    self.timeouts.observe_timeout(name)
+
+    # --- Playwright ---
+
+    def _on_request(self, request) -> None:
+        self._requests[id(request)] = time.monotonic()
+        self._request_count += 1
+
+    def _on_request_done(self, request) -> None:
+        start = self._requests.pop(id(request), None)
+        if start is not None:
+            self._request_intervals.append((start, time.monotonic()))
+
+    def _on_request_failed(self, request) -> None:
+        self._failed_requests += 1
+        self._on_request_done(request)
+
+    async def attach(self, context, flow: str) -> None:
+        """Начинает Playwright trace и учёт сетевых запросов на контексте (только при capture)."""
+        if not self.capture:
+            return
+        context.on("request", self._on_request)
+        context.on("requestfinished", self._on_request_done)
+        context.on("requestfailed", self._on_request_failed)
+        try:
+            await context.tracing.start(name=f"{self.run_id}_{flow}", screenshots=True, snapshots=True)
+        except Exception as e:
+            logger.debug("Playwright tracing не запущен: {}", e)
+
+    async def detach(self, context, flow: str) -> None:
+        """Сохраняет Playwright trace flow в traces/ и снимает обработчики запросов."""
+        if not self.capture:
+            return
+        for event, handler in (
+            ("request", self._on_request),
+            ("requestfinished", self._on_request_done),
+            ("requestfailed", self._on_request_failed),
+        ):
+            try:
+                context.remove_listener(event, handler)
+            except Exception:
+                pass
+        TRACES_DIR.mkdir(exist_ok=True)
+        path = TRACES_DIR / f"{self.run_id}_{flow}.zip"
+        try:
+            await context.tracing.stop(path=str(path))
+            self.trace_files.append(path.name)
+        except Exception as e:
+            logger.debug("Playwright trace не сохранён: {}", e)
+
+    # --- сводка ---
+
+    def summary(self) -> dict[str, Any]:
+        """Время по видам шагов, сетевое время, и список шагов со смещением от начала запуска."""
+        wall = time.monotonic() - self.t0
+        by_kind = {kind: 0.0 for kind in KINDS}
+        for span in self.spans:
+            by_kind[span.kind] = by_kind.get(span.kind, 0.0) + (span.duration or 0.0)
+        in_steps = sum(by_kind.values())
+        return {
+            "run_id": self.run_id,
+            "address": self.eoa_address,
+            "wall_sec": round(wall, 3),
+            "by_kind_sec": {k: round(v, 3) for k, v in by_kind.items()},
+            "other_sec": round(max(0.0, wall - in_steps), 3),
+            "network": {
+                "requests": self._request_count,
+                "failed": self._failed_requests,
+                "in_flight_sec": round(_union_seconds(self._request_intervals), 3),
+            },
+            "steps": [
+                {
+                    "name": s.name,
+                    "kind": s.kind,
+                    "offset_sec": round(s.start - self.t0, 3),
+                    "duration_sec": round(s.duration or 0.0, 3),
+                    "timeout_ms": s.timeout_ms,
+                    "ok": s.ok,
+                }
+                for s in self.spans
+            ],
+            "trace_files": self.trace_files,
+        }
+
+    def format_waterfall(self, summary: Optional[dict[str, Any]] = None) -> str:
+        """Компактный текстовый водопад: смещение, длительность, полоса на шкале запуска."""
+        summary = summary or self.summary()
+        wall = max(summary["wall_sec"], 1e-6)
+        kinds = ", ".join(f"{k} {v:.1f} с" for k, v in summary["by_kind_sec"].items() if v)
+        net = summary["network"]
+        lines = [
+            f"Запуск {self.run_id} ({self.eoa_address}): {wall:.1f} с | {kinds or '—'} | прочее {summary['other_sec']:.1f} с"
+            f" | сеть в полёте {net['in_flight_sec']:.1f} с, запросов {net['requests']} (ошибок {net['failed']})"
+        ]
+        for s in summary["steps"]:
+            begin = int(s["offset_sec"] / wall * WATERFALL_WIDTH)
+            length = max(1, int(round(s["duration_sec"] / wall * WATERFALL_WIDTH)))
+            bar = (" " * begin + "█" * length)[:WATERFALL_WIDTH].ljust(WATERFALL_WIDTH)
+            mark = "" if s["ok"] else " ✗"
+            lines.append(
+                f"  {s['offset_sec']:7.1f} {s['duration_sec']:6.1f} с |{bar}| {s['kind']:<10} {s['name']}{mark}"
+            )
+        return "\n".join(lines)
+
+    def finish(self) -> Optional[Path]:
+        """
+        Сохраняет статистику таймаутов шагов; при capture пишет сводку в traces/, логирует водопад
+        и ограничивает размер каталога.
+        """
+        self.timeouts.save()
+        if not self.capture:
+            return None
+        summary = self.summary()
+        TRACES_DIR.mkdir(exist_ok=True)
+        path = TRACES_DIR / f"{self.run_id}.summary.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info("Трейс запуска:\n{}", self.format_waterfall(summary))
+        enforce_ring_limit()
+        return path
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пул прокси из proxy.txt с оценкой здоровья для API-запросов (profile/mapping).
+
+По каждому прокси ведутся EWMA задержки и EWMA доли успехов. Выбор — случайный с весом
+успешность² / задержка, так что быстрые и живые прокси получают основную нагрузку, но остальные
+тоже периодически проверяются. После PROXY_QUARANTINE_AFTER ошибок подряд прокси уходит в карантин
+с экспоненциальной задержкой; фоновый поток проверяет прокси из карантина и возвращает восстановившиеся.
+Состояние пула публикуется в метрики (раздел "proxies").
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from loguru import logger
+
+from modules import metrics
+
+PROXY_EWMA_ALPHA = 0.3
+PROXY_QUARANTINE_AFTER = 2
+PROXY_BACKOFF_BASE_SEC = 30.0
+PROXY_BACKOFF_MAX_SEC = 30 * 60.0
+PROXY_PROBE_INTERVAL_SEC = 5.0
+# Задержка до первого замера: считаем новый прокси «средним», чтобы он получил шанс
+PROXY_INITIAL_LATENCY_SEC = 2.0
+
+
+class ProxyStats:
+    """Состояние одного прокси в пуле."""
+
+    def __init__(self, proxies: dict[str, str]):
+        self.proxies = proxies
+        # host:port без логина/пароля — для логов и метрик
+        self.label = proxies["http"].rsplit("@", 1)[-1].removeprefix("http://")
+        self.ewma_latency = PROXY_INITIAL_LATENCY_SEC
+        self.ewma_success = 1.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.quarantined_until: Optional[float] = None
+        self.backoff_sec = PROXY_BACKOFF_BASE_SEC
+        self.last_error: Optional[str] = None
+
+    @property
+    def quarantined(self) -> bool:
+        return self.quarantined_until is not None
+
+    def score(self) -> float:
+        return (self.ewma_success ** 2) / max(self.ewma_latency, 0.05)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "proxy": self.label,
+            "ewma_latency_sec": round(self.ewma_latency, 3),
+            "ewma_success": round(self.ewma_success, 3),
+            "score": round(self.score(), 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "quarantined": self.quarantined,
+            "quarantine_left_sec": (
+                round(max(0.0, self.quarantined_until - time.monotonic()), 1) if self.quarantined_until else None
+            ),
+            "last_error": self.last_error,
+        }
+
+
+class ProxyPool:
+    """Выбор прокси по здоровью/задержке, карантин с backoff и фоновые пробы. Потокобезопасен."""
+
+    def __init__(self, proxies_list: list[dict[str, str]]):
+        self._lock = threading.Lock()
+        self._stats = [ProxyStats(p) for p in proxies_list]
+        self._by_url = {s.proxies["http"]: s for s in self._stats}
+        self._prober: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def choose(self, exclude: Optional[set[str]] = None) -> Optional[dict[str, str]]:
+        """
+        Прокси для запроса (dict для requests) или None, если прокси не заданы.
+        exclude — http-URL прокси, уже опробованных в этом запросе.
+        Если все прокси в карантине, берётся тот, у которого карантин кончается раньше всех.
+        """
+        exclude = exclude or set()
+        with self._lock:
+            if not self._stats:
+                return None
+            healthy = [s for s in self._stats if not s.quarantined and s.proxies["http"] not in exclude]
+            if healthy:
+                weights = [s.score() for s in healthy]
+                return random.choices(healthy, weights=weights, k=1)[0].proxies
+            rest = [s for s in self._stats if s.proxies["http"] not in exclude] or self._stats
+            return min(rest, key=lambda s: s.quarantined_until or 0.0).proxies
+
+    def report(self, proxies: Optional[dict[str, str]], ok: bool, latency_sec: float, error: Optional[str] = None) -> None:
+        """Учитывает результат запроса через прокси: EWMA задержки/успеха, карантин при серии ошибок."""
+        if not proxies:
+            return
+        with self._lock:
+            s = self._by_url.get(proxies["http"])
+            if s is None:
+                return
+            s.requests += 1
+            s.ewma_success = (1 - PROXY_EWMA_ALPHA) * s.ewma_success + PROXY_EWMA_ALPHA * (1.0 if ok else 0.0)
+            if ok:
+                s.ewma_latency = (1 - PROXY_EWMA_ALPHA) * s.ewma_latency + PROXY_EWMA_ALPHA * latency_sec
+                s.consecutive_failures = 0
+                if s.quarantined:
+                    logger.info("Прокси {} восстановлен, выходит из карантина", s.label)
+                s.quarantined_until = None
+                s.backoff_sec = PROXY_BACKOFF_BASE_SEC
+            else:
+                s.failures += 1
+                s.consecutive_failures += 1
+                s.last_error = (error or "")[:200] or None
+                if s.quarantined:
+                    s.backoff_sec = min(s.backoff_sec * 2, PROXY_BACKOFF_MAX_SEC)
+                    s.quarantined_until = time.monotonic() + s.backoff_sec
+                elif s.consecutive_failures >= PROXY_QUARANTINE_AFTER:
+                    s.quarantined_until = time.monotonic() + s.backoff_sec
+                    logger.warning("Прокси {} в карантине на {:.0f} с: {}", s.label, s.backoff_sec, s.last_error)
+        self.publish_metrics()
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return sorted((s.as_dict() for s in self._stats), key=lambda d: -d["score"])
+
+    def publish_metrics(self) -> None:
+        metrics.publish("proxies", self.snapshot())
+
+    def start_prober(self, probe: Callable[[dict[str, str]], tuple[bool, float, Optional[str]]]) -> None:
+        """
+        Запускает фоновый поток, который проверяет прокси с истёкшим карантином.
+        probe(proxies) -> (ok, latency_sec, error). Повторный вызов ничего не делает.
+        """
+        if self._prober is not None or not self._stats:
+            return
+
+        def loop() -> None:
+            while True:
+                time.sleep(PROXY_PROBE_INTERVAL_SEC)
+                now = time.monotonic()
+                with self._lock:
+                    due = [s.proxies for s in self._stats if s.quarantined_until and s.quarantined_until <= now]
+                for proxies in due:
+                    try:
+                        ok, latency, error = probe(proxies)
+                    except Exception as e:
+                        ok, latency, error = False, 0.0, str(e)
+                    self.report(proxies, ok, latency, error)
+
+        self._prober = threading.Thread(target=loop, name="proxy-prober", daemon=True)
+        self._prober.start()
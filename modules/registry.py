@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Реестр ключей мониторинга: адрес → индекс и ключ из keys.txt.
+Файл перечитывается при изменении (mtime/размер); адреса считаются только для новых ключей,
+а наружу отдаются добавленные и удалённые адреса — мониторинг ставит в план только их.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+from loguru import logger
+
+from modules import evm
+
+
+class KeyRegistry:
+    """Ключи keys.txt с уже посчитанными адресами. Используется из потока мониторинга."""
+
+    def __init__(self, keys_path: Path, load_keys: Callable[[], list[str]]):
+        self.keys_path = keys_path
+        self._load_keys = load_keys
+        self._addr_by_key: dict[str, Optional[str]] = {}
+        self._key_by_addr: dict[str, str] = {}
+        self._index_by_addr: dict[str, int] = {}
+        self._stamp: Optional[tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._index_by_addr)
+
+    def __contains__(self, addr: str) -> bool:
+        return addr in self._index_by_addr
+
+    def addresses(self) -> list[str]:
+        return list(self._index_by_addr)
+
+    def key_index(self, addr: str) -> Optional[int]:
+        return self._index_by_addr.get(addr)
+
+    def private_key(self, addr: str) -> Optional[str]:
+        return self._key_by_addr.get(addr)
+
+    def _file_stamp(self) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(self.keys_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def load(self, keys: Optional[list[str]] = None) -> tuple[list[str], list[str]]:
+        """
+        Строит реестр по ключам (по умолчанию — перечитывает keys.txt). Возвращает (добавленные, удалённые) адреса.
+        Уже известные ключи повторно не разбираются.
+        """
+        stamp = self._file_stamp()
+        if keys is None:
+            keys = self._load_keys()
+        index_by_addr: dict[str, int] = {}
+        key_by_addr: dict[str, str] = {}
+        addr_by_key: dict[str, Optional[str]] = {}
+        for i, pk in enumerate(keys):
+            if pk in addr_by_key:
+                continue
+            addr = self._addr_by_key[pk] if pk in self._addr_by_key else evm.try_private_key_to_address(pk)
+            addr_by_key[pk] = addr
+            if addr and addr not in index_by_addr:
+                index_by_addr[addr] = i
+                key_by_addr[addr] = pk
+        added = [a for a in index_by_addr if a not in self._index_by_addr]
+        removed = [a for a in self._index_by_addr if a not in index_by_addr]
+        self._addr_by_key = addr_by_key
+        self._key_by_addr = key_by_addr
+        self._index_by_addr = index_by_addr
+        self._stamp = stamp
+        return added, removed
+
+    def reload_if_changed(self) -> Optional[tuple[list[str], list[str]]]:
+        """Перечитывает keys.txt, если файл изменился; иначе None. Ошибка чтения оставляет прежний реестр."""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return None
+        try:
+            return self.load()
+        except (FileNotFoundError, ValueError) as e:
+            # Файл мог быть прочитан посреди записи: пробуем снова при следующем изменении
+            self._stamp = stamp
+            logger.warning("keys.txt изменён, но не прочитан: {}", e)
+            return None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Планировщик аккаунтов мониторинга: очередь по времени следующего GM (min-heap) и политика выбора.
+Не знает ни про часы, ни про браузер — время передаётся аргументом now (секунды, epoch или виртуальные),
+поэтому один и тот же код работает в run_monitor и в симуляторе (modules/simulator.py).
+
+Политики:
+- "edf"  — earliest due first: первым запускается аккаунт, который должен был запуститься раньше всех;
+           монитор просыпается ровно к следующему сроку.
+- "poll" — прежнее поведение: опрос раз в poll_interval, из «должных» берётся первый по порядку в keys.txt.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+from typing import Any, Optional
+
+POLICY_EDF = "edf"
+POLICY_POLL = "poll"
+POLICIES = (POLICY_EDF, POLICY_POLL)
+
+# Через сколько секунд повторить аккаунт, если запуск не сдвинул время следующего GM (ошибка, лимит AdsPower)
+RETRY_DELAY_SEC = 10.0
+
+
+class Scheduler:
+    """Очередь аккаунтов. Аккаунт, выданный dispatch(), из очереди убирается до повторного add()."""
+
+    def __init__(self, policy: str = POLICY_EDF, poll_interval: float = 10.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Неизвестная политика планировщика: {policy}")
+        self.policy = policy
+        self.poll_interval = poll_interval
+        # addr -> (due_ts, order, seq); записи в кучах с другим seq считаются удалёнными
+        self._entries: dict[str, tuple[float, int, int]] = {}
+        self._timeline: list[tuple[float, int, int, str]] = []  # (due_ts, order, seq, addr)
+        self._ready: list[tuple[int, float, int, str]] = []  # политика poll: (order, due_ts, seq, addr)
+        self._seq = itertools.count()
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, addr: str) -> bool:
+        return addr in self._entries
+
+    def add(self, addr: str, due_ts: float, order: Optional[int] = None) -> None:
+        """Ставит (или переставляет) аккаунт на время due_ts. order — порядок в keys.txt (для политики poll)."""
+        if order is None:
+            prev = self._entries.get(addr)
+            order = prev[1] if prev else next(self._order)
+        seq = next(self._seq)
+        self._entries[addr] = (due_ts, order, seq)
+        heapq.heappush(self._timeline, (due_ts, order, seq, addr))
+
+    def remove(self, addr: str) -> None:
+        self._entries.pop(addr, None)
+
+    def due_ts(self, addr: str) -> Optional[float]:
+        entry = self._entries.get(addr)
+        return entry[0] if entry else None
+
+    def _valid(self, seq: int, addr: str) -> bool:
+        entry = self._entries.get(addr)
+        return entry is not None and entry[2] == seq
+
+    def _peek_timeline(self) -> Optional[tuple[float, int, int, str]]:
+        timeline = self._timeline
+        while timeline and not self._valid(timeline[0][2], timeline[0][3]):
+            heapq.heappop(timeline)
+        return timeline[0] if timeline else None
+
+    def dispatch(self, now: float, limit: int) -> list[tuple[str, float]]:
+        """Выдаёт до limit аккаунтов, срок которых наступил, в порядке политики: [(addr, due_ts), ...]."""
+        result: list[tuple[str, float]] = []
+        if limit <= 0:
+            return result
+        timeline = self._timeline
+        entries = self._entries
+        if self.policy == POLICY_EDF:
+            while len(result) < limit and timeline:
+                due_ts, _, seq, addr = timeline[0]
+                entry = entries.get(addr)
+                if entry is None or entry[2] != seq:
+                    heapq.heappop(timeline)
+                    continue
+                if due_ts > now:
+                    break
+                heapq.heappop(timeline)
+                del entries[addr]
+                result.append((addr, due_ts))
+            return result
+        # poll: все наступившие сроки переносим в очередь готовых, упорядоченную по keys.txt
+        while timeline and timeline[0][0] <= now:
+            due_ts, order, seq, addr = heapq.heappop(timeline)
+            if self._valid(seq, addr):
+                heapq.heappush(self._ready, (order, due_ts, seq, addr))
+        while len(result) < limit and self._ready:
+            _, due_ts, seq, addr = heapq.heappop(self._ready)
+            if self._valid(seq, addr):
+                del entries[addr]
+                result.append((addr, due_ts))
+        return result
+
+    def next_wakeup(self, now: float) -> Optional[float]:
+        """Когда в следующий раз есть смысл вызывать dispatch (None — очередь пуста)."""
+        if self.policy == POLICY_POLL:
+            if not self._entries:
+                return None
+            if any(self._valid(seq, addr) for _, _, seq, addr in self._ready):
+                return now
+            # опрос идёт по тактам poll_interval независимо от сроков
+            return (now // self.poll_interval + 1) * self.poll_interval
+        timeline = self._timeline
+        entries = self._entries
+        while timeline:
+            due_ts, _, seq, addr = timeline[0]
+            entry = entries.get(addr)
+            if entry is not None and entry[2] == seq:
+                return due_ts
+            heapq.heappop(timeline)
+        return None
+
+    def has_due(self, now: float) -> bool:
+        """Есть ли аккаунт, срок которого наступил (дёшево: вершина кучи / очередь готовых)."""
+        if any(self._valid(seq, addr) for _, _, seq, addr in self._ready):
+            return True
+        top = self._peek_timeline()
+        return top is not None and top[0] <= now
+
+    def due_count(self, now: float) -> int:
+        """Сколько аккаунтов ждут запуска (срок наступил). O(n) — для метрик, не для горячего цикла."""
+        return sum(1 for due_ts, _, _ in self._entries.values() if due_ts <= now)
+
+    def state(self, now: float, limit: int = 20) -> dict[str, Any]:
+        """Снимок очереди: размер, число «должных», ближайшие сроки (для метрик и отладки)."""
+        upcoming = heapq.nsmallest(limit, ((due_ts, addr) for addr, (due_ts, _, _) in self._entries.items()))
+        return {
+            "policy": self.policy,
+            "queued": len(self._entries),
+            "due": self.due_count(now),
+            "next": [{"address": addr, "in_sec": round(due_ts - now, 1)} for due_ts, addr in upcoming],
+        }
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Дискретно-событийный симулятор мониторинга на виртуальных часах.
+
+Гоняет тот же планировщик, что и run_monitor (modules/scheduler.py), на синтетических аккаунтах:
+длительности запусков, доля ошибок и кулдауны GM берутся из журнала запусков (run_history.jsonl),
+а если истории нет — из значений по умолчанию. Браузер и AdsPower не нужны.
+Отчёт: отставание старта от срока (перцентили), загрузка воркеров, средний бэклог (по закону Литтла), по дням.
+"""
+
+from __future__ import annotations
+
+import heapq
+import random
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+from modules import history
+from modules.scheduler import POLICY_EDF, RETRY_DELAY_SEC, Scheduler
+
+DAY_SEC = 86400.0
+# Значения по умолчанию, если журнал запусков пуст
+DEFAULT_RUNTIME_SEC = (60.0, 150.0)  # равномерно
+DEFAULT_COOLDOWN_SEC = DAY_SEC
+DEFAULT_FAILURE_RATE = 0.05
+# Сколько замеров держать из истории (reservoir sampling — память не растёт с объёмом журнала)
+MAX_HISTORY_SAMPLES = 20000
+# Гистограмма отставания: шаг 1 с до LAG_HIST_MAX_SEC, всё дальше — в последнюю корзину
+LAG_HIST_MAX_SEC = 7 * 86400
+# Сколько случайных значений готовить за раз
+_BATCH = 65536
+
+
+def _reservoir_add(samples: list[float], value: float, seen: int, rng: random.Random) -> None:
+    if len(samples) < MAX_HISTORY_SAMPLES:
+        samples.append(value)
+    else:
+        j = rng.randrange(seen)
+        if j < MAX_HISTORY_SAMPLES:
+            samples[j] = value
+
+
+class Distributions:
+    """Распределения для синтетических аккаунтов: эмпирические выборки или значения по умолчанию."""
+
+    def __init__(
+        self,
+        runtime_ok: Optional[list[float]] = None,
+        runtime_failed: Optional[list[float]] = None,
+        cooldowns: Optional[list[float]] = None,
+        failure_rate: float = DEFAULT_FAILURE_RATE,
+        source: str = "default",
+    ):
+        self.runtime_ok = runtime_ok or []
+        self.runtime_failed = runtime_failed or []
+        self.cooldowns = cooldowns or []
+        self.failure_rate = failure_rate
+        self.source = source
+
+    @classmethod
+    def from_history(cls, seed: int = 0) -> "Distributions":
+        """Читает run_history.jsonl потоково; пустые выборки заменяются значениями по умолчанию при генерации."""
+        rng = random.Random(seed)
+        runtime_ok: list[float] = []
+        runtime_failed: list[float] = []
+        cooldowns: list[float] = []
+        n_ok = n_failed = n_cd = 0
+        total = failed = 0
+        for rec in history.iter_runs():
+            outcome = rec.get("outcome")
+            if outcome == history.OUTCOME_INTERRUPTED:
+                continue
+            duration = rec.get("duration_sec")
+            total += 1
+            if outcome == history.OUTCOME_FAILED:
+                failed += 1
+                if isinstance(duration, (int, float)):
+                    n_failed += 1
+                    _reservoir_add(runtime_failed, float(duration), n_failed, rng)
+                continue
+            if isinstance(duration, (int, float)):
+                n_ok += 1
+                _reservoir_add(runtime_ok, float(duration), n_ok, rng)
+            if outcome == history.OUTCOME_OK and rec.get("next_gm_at") and rec.get("finished_at"):
+                try:
+                    next_at = datetime.fromisoformat(rec["next_gm_at"].replace("Z", "+00:00"))
+                    finished = datetime.fromisoformat(rec["finished_at"].replace("Z", "+00:00"))
+                except ValueError:
+                    continue
+                cooldown = (next_at - finished).total_seconds()
+                if cooldown > 0:
+                    n_cd += 1
+                    _reservoir_add(cooldowns, cooldown, n_cd, rng)
+        if not total:
+            return cls()
+        return cls(
+            runtime_ok=runtime_ok,
+            runtime_failed=runtime_failed,
+            cooldowns=cooldowns,
+            failure_rate=failed / total,
+            source=f"run_history.jsonl ({total} запусков)",
+        )
+
+    def batch_runtime_ok(self, rng: random.Random) -> list[float]:
+        if self.runtime_ok:
+            return rng.choices(self.runtime_ok, k=_BATCH)
+        lo, hi = DEFAULT_RUNTIME_SEC
+        return [rng.uniform(lo, hi) for _ in range(_BATCH)]
+
+    def batch_runtime_failed(self, rng: random.Random) -> list[float]:
+        if self.runtime_failed:
+            return rng.choices(self.runtime_failed, k=_BATCH)
+        return self.batch_runtime_ok(rng)
+
+    def batch_cooldown(self, rng: random.Random) -> list[float]:
+        if self.cooldowns:
+            return rng.choices(self.cooldowns, k=_BATCH)
+        return [DEFAULT_COOLDOWN_SEC] * _BATCH
+
+    def mean_cooldown(self) -> float:
+        return sum(self.cooldowns) / len(self.cooldowns) if self.cooldowns else DEFAULT_COOLDOWN_SEC
+
+
+class _Sampler:
+    """Бесконечный источник значений, который добирает пачки по _BATCH (дешевле, чем rng на каждое событие)."""
+
+    def __init__(self, make_batch, rng: random.Random):
+        self._make_batch = make_batch
+        self._rng = rng
+        self._buf: list[float] = []
+
+    def next(self) -> float:
+        if not self._buf:
+            self._buf = self._make_batch(self._rng)
+        return self._buf.pop()
+
+
+def _hist_percentile(hist: list[int], total: int, pct: float) -> Optional[float]:
+    if not total:
+        return None
+    target = max(1, -(-total * pct // 100))
+    acc = 0
+    for value, count in enumerate(hist):
+        acc += count
+        if acc >= target:
+            return float(value)
+    return float(len(hist) - 1)
+
+
+def simulate(
+    accounts: int,
+    days: float,
+    workers: int,
+    policy: str = POLICY_EDF,
+    dist: Optional[Distributions] = None,
+    seed: int = 0,
+    poll_interval: float = RETRY_DELAY_SEC,
+) -> dict[str, Any]:
+    """
+    Прогоняет accounts синтетических аккаунтов через Scheduler с workers параллельными запусками
+    на протяжении days виртуальных суток. Начальные сроки равномерно размазаны по первому кулдауну.
+    """
+    dist = dist or Distributions()
+    rng = random.Random(seed)
+    horizon = days * DAY_SEC
+    sched = Scheduler(policy=policy, poll_interval=poll_interval)
+    spread = dist.mean_cooldown()
+    for i in range(accounts):
+        sched.add(i, rng.uniform(0.0, spread), order=i)
+
+    runtime_ok = _Sampler(dist.batch_runtime_ok, rng)
+    runtime_failed = _Sampler(dist.batch_runtime_failed, rng)
+    cooldown = _Sampler(dist.batch_cooldown, rng)
+    failure_rate = dist.failure_rate
+    rand = rng.random
+
+    ndays = max(1, int(-(-horizon // DAY_SEC)))
+    lag_hist = [0] * (LAG_HIST_MAX_SEC + 1)
+    day_runs = [0] * ndays
+    day_lag_sum = [0.0] * ndays
+    day_lag_max = [0.0] * ndays
+    day_busy = [0.0] * ndays
+    lag_max = 0.0
+    runs = failures = 0
+    busy = 0.0
+
+    # Исход и длительность запуска известны при старте, поэтому следующий срок аккаунта ставится в план сразу,
+    # а от запусков остаются только времена окончания — они нужны, лишь когда заняты все воркеры
+    ends: list[float] = []
+    poll = policy != POLICY_EDF
+    t = 0.0
+    heappush, heappop = heapq.heappush, heapq.heappop
+    dispatch, add, next_wakeup = sched.dispatch, sched.add, sched.next_wakeup
+    next_ok, next_failed, next_cooldown = runtime_ok.next, runtime_failed.next, cooldown.next
+    while True:
+        while ends and ends[0] <= t:
+            heappop(ends)
+        free = workers - len(ends)
+        if free > 0:
+            day = int(t // DAY_SEC)
+            for acc, due_ts in dispatch(t, free):
+                lag = t - due_ts
+                if lag > 0:
+                    day_lag_sum[day] += lag
+                    if lag > day_lag_max[day]:
+                        day_lag_max[day] = lag
+                        if lag > lag_max:
+                            lag_max = lag
+                    lag_hist[int(lag) if lag < LAG_HIST_MAX_SEC else LAG_HIST_MAX_SEC] += 1
+                else:
+                    lag_hist[0] += 1  # запуск ровно в срок — самый частый случай при свободных воркерах
+                runs += 1
+                if rand() >= failure_rate:
+                    end = t + next_ok()
+                    add(acc, end + next_cooldown(), acc)
+                else:
+                    failures += 1
+                    end = t + next_failed()
+                    add(acc, end + RETRY_DELAY_SEC, acc)
+                heappush(ends, end)
+                day_runs[day] += 1
+                span = (end if end < horizon else horizon) - t
+                busy += span
+                day_busy[day] += span  # упрощение: весь запуск относится к дню старта
+            free = workers - len(ends)
+        if free > 0:
+            # Есть свободный воркер: следующее событие — ближайший срок. Окончания запусков важны только для poll:
+            # мониторинг просыпается по завершению запуска и забирает всех «должных», не дожидаясь такта опроса
+            next_t = next_wakeup(t)
+            if next_t is None:
+                break
+            if next_t < t:
+                next_t = t
+            if poll and ends and ends[0] < next_t:
+                next_t = ends[0]
+        else:
+            next_t = ends[0]
+        if next_t >= horizon:
+            break
+        t = next_t
+
+    total_lag = sum(day_lag_sum)
+    return {
+        "accounts": accounts,
+        "days": days,
+        "workers": workers,
+        "policy": policy,
+        "distributions": dist.source,
+        "runs": runs,
+        "failures": failures,
+        "utilization": busy / (workers * horizon) if horizon else 0.0,
+        "mean_backlog": total_lag / horizon if horizon else 0.0,
+        "lag_sec": {
+            "p50": _hist_percentile(lag_hist, runs, 50),
+            "p90": _hist_percentile(lag_hist, runs, 90),
+            "p99": _hist_percentile(lag_hist, runs, 99),
+            "max": round(lag_max, 1),
+            "mean": total_lag / runs if runs else None,
+        },
+        "per_day": [
+            {
+                "day": d + 1,
+                "runs": day_runs[d],
+                "lag_mean_sec": day_lag_sum[d] / day_runs[d] if day_runs[d] else None,
+                "lag_max_sec": round(day_lag_max[d], 1),
+                "utilization": day_busy[d] / (workers * DAY_SEC),
+                "mean_backlog": day_lag_sum[d] / DAY_SEC,
+            }
+            for d in range(ndays)
+        ],
+    }
+
+
+def simulate_timed(accounts: int, days: float, workers: int, policy: str, dist: Distributions, seed: int) -> dict[str, Any]:
+    """simulate() с временем прогона в wall_sec (для запуска сочетаний в отдельных процессах)."""
+    t0 = time.perf_counter()
+    result = simulate(accounts, days, workers, policy=policy, dist=dist, seed=seed)
+    result["wall_sec"] = round(time.perf_counter() - t0, 3)
+    return result
+
+
+def _fmt(value: Optional[float], unit: str = " с") -> str:
+    return "—" if value is None else f"{value:.1f}{unit}"
+
+
+def format_result(result: dict[str, Any], per_day: bool = False) -> str:
+    """Строка отчёта по одному прогону (и, по желанию, таблица по дням)."""
+    lag = result["lag_sec"]
+    lines = [
+        f"policy={result['policy']:<4} workers={result['workers']:<4} запусков {result['runs']} "
+        f"(ошибок {result['failures']}) | загрузка {result['utilization'] * 100:5.1f}% | "
+        f"бэклог {result['mean_backlog']:.1f} | отставание p50 {_fmt(lag['p50'])}, p90 {_fmt(lag['p90'])}, "
+        f"p99 {_fmt(lag['p99'])}, max {_fmt(lag['max'])}"
+    ]
+    if per_day:
+        for d in result["per_day"]:
+            lines.append(
+                f"  день {d['day']:>3}: запусков {d['runs']:>8}, отставание ср. {_fmt(d['lag_mean_sec'])}, "
+                f"max {_fmt(d['lag_max_sec'])}, загрузка {d['utilization'] * 100:5.1f}%, бэклог {d['mean_backlog']:.1f}"
+            )
+    return "\n".join(lines)
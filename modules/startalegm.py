@@ -8,21 +8,31 @@ StartaleGM — импорт кошелька в Rabby и открытие https:
 from __future__ import annotations
 
 import asyncio
-import random
+import os
+import queue
 import re
 import sys
+import threading
 import time
 import uuid
+from concurrent import futures
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-from typing import Any, Optional
-import requests
+from typing import Any, Iterator, Optional
 from loguru import logger
-from web3 import Web3
 
-from modules import db
+from modules import assetcache, db, evm, history, journal, metrics, perftrace
+from modules.concurrency import ConcurrencyController
+from modules.control import CONTROL_TIMEOUT_SEC, ControlServer
+from modules.logsetup import setup_logging
+from modules.perftrace import KIND_API, KIND_NAVIGATION, KIND_POPUP, KIND_SELECTOR, KIND_SLEEP
+from modules.proxies import ProxyPool
+from modules.registry import KeyRegistry
+from modules.scheduler import POLICY_EDF, RETRY_DELAY_SEC, Scheduler
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+KEYS_PATH = PROJECT_ROOT / "keys.txt"
 if __name__ == "__main__":
     if str(PROJECT_ROOT) not in sys.path:
         sys.path.insert(0, str(PROJECT_ROOT))
@@ -36,13 +46,19 @@ RABBY_EXTENSION_ID = "acmacodkjbdgmoleebolmdjonilkdbch"
 NEXT_GM_TEXT_SELECTOR = "div.relative.z-10 p.text-sm.text-zinc-900"
 # Пауза после загрузки app.startale.com, чтобы подтянулись данные текущего аккаунта
 WAIT_FOR_GM_DATA_SEC = 10
+# Подготовленный заранее аккаунт: сколько после срока ещё ждать кнопку GM и как часто перепроверять
+PREWARM_GRACE_SEC = 120
+PREWARM_RECHECK_SEC = 10
+# Пакетный режим: сколько ждать Connect в Rabby при повторном подключении сайта и чьи данные стирать между кошельками
+BATCH_CONNECT_PROBE_MS = 5000
+BATCH_CLEAR_ORIGINS = ("https://app.startale.com",)
 # Если время следующего GM не удалось получить, ставим «доступен через N минут», чтобы не крутить аккаунт каждые 10 с
 FALLBACK_GM_COOLDOWN_MINUTES = 60
 
 
 def load_private_key(key_index: int = 0) -> str:
     """Загружает приватный ключ из keys.txt по индексу."""
-    keys_file = PROJECT_ROOT / "keys.txt"
+    keys_file = KEYS_PATH
     if not keys_file.exists():
         raise FileNotFoundError(
             f"Файл {keys_file} не найден. Создайте файл и укажите в нём приватные ключи."
@@ -67,7 +83,7 @@ def load_private_key(key_index: int = 0) -> str:
 
 def load_all_keys() -> list[str]:
     """Загружает все приватные ключи из keys.txt."""
-    keys_file = PROJECT_ROOT / "keys.txt"
+    keys_file = KEYS_PATH
     if not keys_file.exists():
         raise FileNotFoundError(f"Файл {keys_file} не найден.")
     keys = []
@@ -87,22 +103,16 @@ def load_all_keys() -> list[str]:
 def get_address_for_key_index(key_index: int) -> str:
     """Возвращает EOA-адрес (checksum) для ключа по индексу в keys.txt."""
     private_key = load_private_key(key_index)
-    return Web3.to_checksum_address(Web3().eth.account.from_key(private_key).address)
+    return evm.private_key_to_address(private_key)
 
 
 def get_key_index_for_address(address: str, keys: Optional[list[str]] = None) -> Optional[int]:
     """Возвращает индекс ключа в keys.txt для данного EOA-адреса или None."""
     if keys is None:
         keys = load_all_keys()
-    addr_norm = Web3.to_checksum_address(address)
-    for i, pk in enumerate(keys):
-        try:
-            a = Web3.to_checksum_address(Web3().eth.account.from_key(pk).address)
-            if a == addr_norm:
-                return i
-        except Exception:
-            continue
-    return None
+    registry = KeyRegistry(KEYS_PATH, load_all_keys)
+    registry.load(keys)
+    return registry.key_index(evm.to_checksum_address(address))
 
 
 def load_adspower_api_key() -> str:
@@ -145,26 +155,88 @@ def load_proxies() -> list[dict[str, str]]:
     return result
 
 
-def check_smart_account_exists(eoa_address: str) -> bool:
-    """Проверяет через API profile/mapping, есть ли смарт-аккаунт. Использует случайный прокси из proxy.txt."""
-    proxies_list = load_proxies()
-    proxies = random.choice(proxies_list) if proxies_list else None
-    url = f"{PROFILE_MAPPING_URL}?eoaAddress={eoa_address}"
-    headers = {
-        "accept": "application/json, text/plain, */*",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-    }
+MAPPING_HEADERS = {
+    "accept": "application/json, text/plain, */*",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
+}
+MAPPING_TIMEOUT_SEC = 15
+# Сколько разных прокси пробовать для одного запроса profile/mapping
+MAPPING_MAX_ATTEMPTS = 3
+# Адрес для фоновой проверки прокси: ответ 404 означает, что прокси рабочий
+PROBE_EOA_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+_proxy_pool: Optional[ProxyPool] = None
+_proxy_pool_lock = threading.Lock()
+
+
+def _is_mapping_answer(status_code: int) -> bool:
+    """
+    Ответ profile/mapping по существу: 2xx — смарт-аккаунт есть, 404 — нет. Всё остальное (403/407/429,
+    502/503/504 от прокси с упавшим upstream и т.д.) — неудачная попытка через этот прокси.
+    """
+    return status_code == 404 or 200 <= status_code < 300
+
+
+def _probe_proxy(proxies: dict[str, str]) -> tuple[bool, float, Optional[str]]:
+    """Фоновая проверка прокси из карантина лёгким запросом profile/mapping."""
+    import requests
+
+    t0 = time.monotonic()
     try:
-        r = requests.get(url, headers=headers, proxies=proxies, timeout=15)
-        # 404 = смарт-аккаунт не создан; 200 (любой ответ, в т.ч. с пустым массивом) = создан
-        if r.status_code == 404:
-            return False
-        if r.ok:
-            return True
-        return False
+        r = requests.get(
+            f"{PROFILE_MAPPING_URL}?eoaAddress={PROBE_EOA_ADDRESS}",
+            headers=MAPPING_HEADERS, proxies=proxies, timeout=MAPPING_TIMEOUT_SEC,
+        )
     except Exception as e:
-        logger.warning("Проверка profile/mapping не удалась: {}", e)
-        return False
+        return False, time.monotonic() - t0, str(e)
+    latency = time.monotonic() - t0
+    if not _is_mapping_answer(r.status_code):
+        return False, latency, f"HTTP {r.status_code}"
+    return True, latency, None
+
+
+def get_proxy_pool() -> ProxyPool:
+    """Общий пул прокси из proxy.txt (создаётся при первом обращении вместе с фоновыми пробами)."""
+    global _proxy_pool
+    with _proxy_pool_lock:
+        if _proxy_pool is None:
+            _proxy_pool = ProxyPool(load_proxies())
+            _proxy_pool.start_prober(_probe_proxy)
+            _proxy_pool.publish_metrics()
+        return _proxy_pool
+
+
+def check_smart_account_exists(eoa_address: str) -> Optional[bool]:
+    """
+    Проверяет через API profile/mapping, есть ли смарт-аккаунт. Прокси выбирается пулом по здоровью и задержке;
+    при сетевой ошибке или блокировке запрос повторяется через другой прокси (до MAPPING_MAX_ATTEMPTS).
+    Возвращает None, если ответ получить не удалось — это «неизвестно», а не «смарт-аккаунта нет».
+    """
+    import requests
+
+    pool = get_proxy_pool()
+    url = f"{PROFILE_MAPPING_URL}?eoaAddress={eoa_address}"
+    tried: set[str] = set()
+    for _ in range(max(1, min(MAPPING_MAX_ATTEMPTS, len(pool)))):
+        proxies = pool.choose(exclude=tried)
+        if proxies:
+            tried.add(proxies["http"])
+        t0 = time.monotonic()
+        try:
+            r = requests.get(url, headers=MAPPING_HEADERS, proxies=proxies, timeout=MAPPING_TIMEOUT_SEC)
+        except Exception as e:
+            pool.report(proxies, False, time.monotonic() - t0, str(e))
+            logger.warning("Проверка profile/mapping не удалась: {}", e)
+            continue
+        latency = time.monotonic() - t0
+        if not _is_mapping_answer(r.status_code):
+            pool.report(proxies, False, latency, f"HTTP {r.status_code}")
+            logger.warning("Проверка profile/mapping: HTTP {}, пробуем другой прокси", r.status_code)
+            continue
+        pool.report(proxies, True, latency)
+        # 404 = смарт-аккаунт не создан; 2xx (любой ответ, в т.ч. с пустым массивом) = создан
+        return r.status_code != 404
+    return None
 
 
 def _format_next_gm_at(dt: datetime) -> str:
@@ -276,20 +348,31 @@ class StartaleGMBrowser:
         base_url: Optional[str] = None,
         timeout: int = 30,
     ):
+        import requests  # ленивый импорт: не тормозит холодный старт main.py
+
         self.api_key = api_key
         self.base_url = base_url or f"http://local.adspower.net:{api_port}"
         self.timeout = timeout
         self.profile_id: Optional[str] = None
+        # Последний начатый шаг run_one и выбранный сценарий — для журнала запусков (failed_step)
+        self.current_step: Optional[str] = None
+        self.current_flow: Optional[str] = None
+        # Момент нажатия "Send GM back" в текущем запуске (для журнала: отставание GM от срока)
+        self.gm_clicked_at: Optional[datetime] = None
+        # CDP endpoint браузера в пакетном режиме (run_batch_member / close_batch)
+        self.batch_cdp: Optional[str] = None
+        # Шаги текущего запуска (и при выборке — Playwright trace); заменяется в run_one
+        self.trace = perftrace.RunTrace(run_id="-", eoa_address="-")
         self.session = requests.Session()
         self.session.headers.update(
             {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
         )
 
     def _make_request(
-        self, method: str, endpoint: str, data: Optional[dict] = None
+        self, method: str, endpoint: str, data: Optional[dict] = None, params: Optional[dict] = None
     ) -> dict:
         url = f"{self.base_url}{endpoint}"
-        params = {"api_key": self.api_key}
+        params = {"api_key": self.api_key, **(params or {})}
         if method.upper() == "GET":
             r = self.session.get(url, params=params, timeout=self.timeout)
         elif method.upper() == "POST":
@@ -339,6 +422,18 @@ class StartaleGMBrowser:
         logger.info("Браузер запущен")
         return data
 
+    def get_browser_status(self, profile_id: str) -> Optional[dict]:
+        """Данные запущенного браузера профиля (с ws endpoint) или None, если браузер не активен/профиля нет."""
+        try:
+            result = self._make_request("GET", "/api/v2/browser-profile/active", params={"profile_id": profile_id})
+        except Exception as e:
+            logger.debug(f"Статус браузера {profile_id}: {e}")
+            return None
+        data = result.get("data") or {}
+        if str(data.get("status", "")).lower() != "active":
+            return None
+        return data
+
     def stop_browser(self, profile_id: Optional[str] = None) -> None:
         """Останавливает браузер."""
         pid = profile_id or self.profile_id
@@ -372,57 +467,162 @@ class StartaleGMBrowser:
         """Импортирует кошелёк в Rabby по CDP."""
         from playwright.async_api import async_playwright
 
+        trace = self.trace
         playwright = await async_playwright().start()
+        context = None
         try:
             browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
             if not browser.contexts:
                 raise RuntimeError("Нет контекстов в браузере")
             context = browser.contexts[0]
+            await trace.attach(context, "import_wallet")
             setup_url = f"chrome-extension://{RABBY_EXTENSION_ID}/index.html#/new-user/guide"
             page = None
             for p in context.pages:
                 if RABBY_EXTENSION_ID in p.url or ("chrome-extension://" in p.url and "rabby" in p.url.lower()):
                     page = p
                     if "#/new-user/guide" not in p.url:
-                        await page.goto(setup_url)
+                        with trace.step("import.goto_guide", KIND_NAVIGATION, 30000) as st:
+                            await page.goto(setup_url, timeout=st.timeout_ms)
                         await asyncio.sleep(2)
                     break
             if not page:
                 page = await context.new_page()
-                await page.goto(setup_url)
+                with trace.step("import.goto_guide", KIND_NAVIGATION, 30000) as st:
+                    await page.goto(setup_url, timeout=st.timeout_ms)
                 await asyncio.sleep(3)
 
-            await page.wait_for_selector('span:has-text("I already have an address")', timeout=30000)
-            await page.click('span:has-text("I already have an address")')
-            await page.wait_for_selector('div.rabby-ItemWrapper-rabby--mylnj7:has-text("Private Key")', timeout=30000)
-            await page.click('div.rabby-ItemWrapper-rabby--mylnj7:has-text("Private Key")')
-            await page.wait_for_selector("#privateKey", timeout=30000)
-            await page.fill("#privateKey", private_key)
-            await page.wait_for_selector('button:has-text("Confirm"):not([disabled])', timeout=30000)
-            await page.click('button:has-text("Confirm"):not([disabled])')
-            await page.wait_for_selector("#password", timeout=30000)
-            await page.fill("#password", password)
-            await page.press("#password", "Tab")
-            await page.keyboard.type(password)
-            await page.wait_for_selector('button:has-text("Confirm"):not([disabled])', timeout=30000)
-            await page.click('button:has-text("Confirm"):not([disabled])')
-            await page.wait_for_selector("text=Imported Successfully", timeout=30000)
+            with trace.step("import.have_address", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector('span:has-text("I already have an address")', timeout=st.timeout_ms)
+                await page.click('span:has-text("I already have an address")', timeout=st.timeout_ms)
+            with trace.step("import.private_key_option", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector('div.rabby-ItemWrapper-rabby--mylnj7:has-text("Private Key")', timeout=st.timeout_ms)
+                await page.click('div.rabby-ItemWrapper-rabby--mylnj7:has-text("Private Key")', timeout=st.timeout_ms)
+            with trace.step("import.private_key_input", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector("#privateKey", timeout=st.timeout_ms)
+                await page.fill("#privateKey", private_key)
+            with trace.step("import.confirm_key", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector('button:has-text("Confirm"):not([disabled])', timeout=st.timeout_ms)
+                await page.click('button:has-text("Confirm"):not([disabled])', timeout=st.timeout_ms)
+            with trace.step("import.password_input", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector("#password", timeout=st.timeout_ms)
+                await page.fill("#password", password)
+                await page.press("#password", "Tab")
+                await page.keyboard.type(password)
+            with trace.step("import.confirm_password", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector('button:has-text("Confirm"):not([disabled])', timeout=st.timeout_ms)
+                await page.click('button:has-text("Confirm"):not([disabled])', timeout=st.timeout_ms)
+            with trace.step("import.success", KIND_SELECTOR, 30000) as st:
+                await page.wait_for_selector("text=Imported Successfully", timeout=st.timeout_ms)
             logger.success("Кошелёк импортирован в Rabby")
             await page.close()
             logger.info("Вкладка импорта кошелька закрыта")
         finally:
+            if context is not None:
+                await trace.detach(context, "import_wallet")
             await playwright.stop()
 
-    async def _open_portal(self, cdp_endpoint: str, eoa_address: str) -> None:
-        """Открывает https://portal.soneium.org/ в браузере. eoa_address — адрес кошелька для проверки API profile/mapping."""
+    async def _reload_for_gm(self, page, flow: str, reload: bool = True) -> None:
+        """Перезагружает app.startale.com (если reload) и ждёт кнопку "Send GM back" не дольше WAIT_FOR_GM_DATA_SEC."""
+        trace = self.trace
+        if reload:
+            with trace.step(f"{flow}.reload_app", KIND_NAVIGATION, 60000) as st:
+                await page.reload(wait_until="domcontentloaded", timeout=st.timeout_ms)
+        try:
+            with trace.step(f"{flow}.wait_gm_button", KIND_SELECTOR):
+                await page.get_by_role("button", name="Send GM back").wait_for(
+                    state="visible", timeout=WAIT_FOR_GM_DATA_SEC * 1000
+                )
+        except Exception:
+            pass  # кнопки нет — дальше проверяется отсчёт «Next GM available in»
+
+    async def _read_or_send_gm(self, page, eoa_address: str, flow: str, gm_not_before: Optional[float] = None) -> None:
+        """
+        На app.startale.com: ждёт загрузки данных аккаунта; если виден «Next GM available in» — сохраняет время,
+        иначе жмёт "Send GM back" и берёт время следующего GM из модалки "GM sent!" (или ставит fallback).
+        gm_not_before — срок GM (epoch) аккаунта, подготовленного заранее: страница держится открытой до срока
+        и перезагружается к нему; пока сайт ещё показывает отсчёт, проверка повторяется до PREWARM_GRACE_SEC после срока.
+        """
+        trace = self.trace
+        deadline: Optional[float] = None
+        if gm_not_before is not None:
+            deadline = gm_not_before + PREWARM_GRACE_SEC
+            left = gm_not_before - time.time()
+            if left > 0:
+                logger.info("Аккаунт подготовлен, до срока GM {:.0f} с", left)
+                with trace.step(f"{flow}.wait_due", KIND_SLEEP):
+                    await asyncio.sleep(left)
+            await self._reload_for_gm(page, flow, reload=left > 0)
+        else:
+            with trace.step(f"{flow}.wait_gm_data", KIND_SLEEP):
+                await asyncio.sleep(WAIT_FOR_GM_DATA_SEC)
+        while True:
+            next_gm_visible = False
+            next_at: Optional[datetime] = None
+            try:
+                text = await _get_next_gm_text_from_page(page)
+                if text and "Next GM available in" in text:
+                    next_gm_visible = True
+                    next_at = parse_next_gm_available(text)
+            except Exception:
+                pass
+            if not next_gm_visible:
+                break
+            if deadline is not None and time.time() < deadline and (next_at is None or next_at.timestamp() <= deadline):
+                # Отсчёт на сайте с точностью до минуты: срок по БД наступил, а кнопки ещё нет — ждём и проверяем снова
+                with trace.step(f"{flow}.wait_due", KIND_SLEEP):
+                    await asyncio.sleep(PREWARM_RECHECK_SEC)
+                await self._reload_for_gm(page, flow)
+                continue
+            if next_at:
+                db.upsert_account(eoa_address, next_gm_available_at=next_at)
+                logger.success("Следующий GM доступен: {}", _format_next_gm_at(next_at))
+            return
+        try:
+            with trace.step(f"{flow}.send_gm_button", KIND_SELECTOR, 15000) as st:
+                send_gm_btn = page.get_by_role("button", name="Send GM back")
+                await send_gm_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await send_gm_btn.click(timeout=st.timeout_ms)
+            self.gm_clicked_at = datetime.now(timezone.utc)
+            logger.success('Нажата кнопка "Send GM back"')
+            with trace.step(f"{flow}.gm_sent_modal", KIND_SELECTOR, 120000) as st:
+                await page.locator("h2:has-text('GM sent!')").wait_for(state="visible", timeout=st.timeout_ms)
+            logger.success('Появилось модальное окно "GM sent!"')
+            try:
+                with trace.step(f"{flow}.next_gm_from_modal", KIND_SELECTOR):
+                    text = await _get_next_gm_text_from_modal(page)
+                next_at = parse_next_gm_available(text or "") if text else None
+                if next_at:
+                    db.upsert_account(eoa_address, next_gm_available_at=next_at)
+                    logger.success("Следующий GM доступен: {}", _format_next_gm_at(next_at))
+                else:
+                    fallback_at = datetime.now(timezone.utc) + timedelta(minutes=FALLBACK_GM_COOLDOWN_MINUTES)
+                    db.upsert_account(eoa_address, next_gm_available_at=fallback_at)
+                    logger.warning("Время из модалки не распознано, записан fallback: {}", _format_next_gm_at(fallback_at))
+            except Exception:
+                fallback_at = datetime.now(timezone.utc) + timedelta(minutes=FALLBACK_GM_COOLDOWN_MINUTES)
+                db.upsert_account(eoa_address, next_gm_available_at=fallback_at)
+                logger.warning("Не удалось прочитать время из модалки, записан fallback: {}", _format_next_gm_at(fallback_at))
+        except Exception:
+            logger.debug("Кнопка Send GM back не найдена или модалка не появилась")
+
+    async def _open_portal(self, cdp_endpoint: str, eoa_address: str, gm_not_before: Optional[float] = None) -> None:
+        """
+        Открывает https://portal.soneium.org/ в браузере. eoa_address — адрес кошелька для проверки API profile/mapping.
+        gm_not_before — см. _read_or_send_gm.
+        """
         from playwright.async_api import async_playwright
 
+        trace = self.trace
         playwright = await async_playwright().start()
+        context = None
         try:
             browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
             if not browser.contexts:
                 raise RuntimeError("Нет контекстов в браузере")
             context = browser.contexts[0]
+            await trace.attach(context, "portal")
+            await assetcache.attach(context)
             page = None
             for p in context.pages:
                 if not p.url.startswith("chrome-extension://"):
@@ -430,64 +630,76 @@ class StartaleGMBrowser:
                     break
             if not page:
                 page = await context.new_page()
-            await page.goto(PORTAL_URL, wait_until="domcontentloaded", timeout=60000)
+            with trace.step("portal.goto_portal", KIND_NAVIGATION, 60000) as st:
+                await page.goto(PORTAL_URL, wait_until="domcontentloaded", timeout=st.timeout_ms)
             logger.success(f"Открыта страница: {PORTAL_URL}")
             await asyncio.sleep(2)
 
             # Основная страница портала: кнопка Connect Wallet; клик открывает popup Startale. Кликаем через JS, чтобы сработало даже при перекрытии/задержках.
             connect_wallet_btn = page.get_by_test_id("connect-wallet-button")
-            await connect_wallet_btn.wait_for(state="visible", timeout=20000)
-            await connect_wallet_btn.scroll_into_view_if_needed()
+            with trace.step("portal.connect_wallet_button", KIND_SELECTOR, 20000) as st:
+                await connect_wallet_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await connect_wallet_btn.scroll_into_view_if_needed(timeout=st.timeout_ms)
             await asyncio.sleep(1)
-            async with context.expect_page(timeout=35000) as popup_info:
-                await connect_wallet_btn.evaluate("el => el.click()")
-            popup_page = await popup_info.value
-            await popup_page.wait_for_load_state("domcontentloaded", timeout=30000)
+            with trace.step("portal.startale_popup", KIND_POPUP, 35000) as st:
+                async with context.expect_page(timeout=st.timeout_ms) as popup_info:
+                    await connect_wallet_btn.evaluate("el => el.click()")
+                popup_page = await popup_info.value
+                await popup_page.wait_for_load_state("domcontentloaded", timeout=st.timeout_ms)
             logger.success('Нажата "Connect Wallet", открыт popup Startale')
 
             # В popup Startale: Connect a wallet → Rabby → popup кошелька (Connect, затем закрывается) → новый popup кошелька (Sign/Confirm) → затем Approve в popup Startale.
-            connect_btn = popup_page.get_by_role("button", name="Connect a wallet")
-            await connect_btn.wait_for(state="visible", timeout=30000)
-            await connect_btn.click()
+            with trace.step("portal.connect_a_wallet", KIND_SELECTOR, 30000) as st:
+                connect_btn = popup_page.get_by_role("button", name="Connect a wallet")
+                await connect_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await connect_btn.click(timeout=st.timeout_ms)
             logger.success('В popup нажата кнопка "Connect a wallet"')
             await asyncio.sleep(2)
 
-            rabby_btn = popup_page.get_by_role("button", name="Rabby")
-            await rabby_btn.wait_for(state="visible", timeout=30000)
+            with trace.step("portal.rabby_button", KIND_SELECTOR, 30000) as st:
+                rabby_btn = popup_page.get_by_role("button", name="Rabby")
+                await rabby_btn.wait_for(state="visible", timeout=st.timeout_ms)
             # Клик по Rabby открывает popup окно расширения кошелька — ждём его
-            async with context.expect_page() as wallet_popup_info:
-                await rabby_btn.click()
-            wallet_popup = await wallet_popup_info.value
-            await wallet_popup.wait_for_load_state("domcontentloaded", timeout=15000)
+            # Потолок — прежний таймаут Playwright по умолчанию (expect_page был без явного значения)
+            with trace.step("portal.wallet_popup", KIND_POPUP, 30000) as st:
+                async with context.expect_page(timeout=st.timeout_ms) as wallet_popup_info:
+                    await rabby_btn.click(timeout=st.timeout_ms)
+                wallet_popup = await wallet_popup_info.value
+                await wallet_popup.wait_for_load_state("domcontentloaded", timeout=st.timeout_ms)
             logger.success('Открыто popup окно кошелька Rabby')
 
             # В popup кошелька: Connect (после клика этот popup закрывается)
-            connect_btn_wallet = wallet_popup.get_by_role("button", name="Connect")
-            await connect_btn_wallet.wait_for(state="visible", timeout=30000)
-            await connect_btn_wallet.click()
+            with trace.step("portal.wallet_connect", KIND_SELECTOR, 30000) as st:
+                connect_btn_wallet = wallet_popup.get_by_role("button", name="Connect")
+                await connect_btn_wallet.wait_for(state="visible", timeout=st.timeout_ms)
+                await connect_btn_wallet.click(timeout=st.timeout_ms)
             logger.success('Нажата кнопка Connect в popup кошелька')
 
             # После Connect открывается новый popup с Sign и Confirm — ждём его
-            sign_popup = await context.wait_for_event("page", timeout=30000)
-            await sign_popup.wait_for_load_state("domcontentloaded", timeout=15000)
+            with trace.step("portal.sign_popup", KIND_POPUP, 30000) as st:
+                sign_popup = await context.wait_for_event("page", timeout=st.timeout_ms)
+                await sign_popup.wait_for_load_state("domcontentloaded", timeout=st.timeout_ms)
             logger.success('Открыт новый popup кошелька (Sign/Confirm)')
 
-            sign_btn = sign_popup.get_by_role("button", name="Sign")
-            await sign_btn.wait_for(state="visible", timeout=30000)
-            await sign_btn.click()
+            with trace.step("portal.sign", KIND_SELECTOR, 30000) as st:
+                sign_btn = sign_popup.get_by_role("button", name="Sign")
+                await sign_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await sign_btn.click(timeout=st.timeout_ms)
             logger.success('Нажата кнопка Sign в popup кошелька')
             await asyncio.sleep(1)
 
-            confirm_btn = sign_popup.get_by_role("button", name="Confirm")
-            await confirm_btn.wait_for(state="visible", timeout=30000)
-            await confirm_btn.click()
+            with trace.step("portal.confirm", KIND_SELECTOR, 30000) as st:
+                confirm_btn = sign_popup.get_by_role("button", name="Confirm")
+                await confirm_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await confirm_btn.click(timeout=st.timeout_ms)
             logger.success('Нажата кнопка Confirm в popup кошелька')
             await asyncio.sleep(1)
 
             # В popup Startale App после Sign/Confirm в кошельке появляется кнопка Approve
-            approve_btn = popup_page.get_by_role("button", name="Approve")
-            await approve_btn.wait_for(state="visible", timeout=30000)
-            await approve_btn.click()
+            with trace.step("portal.approve", KIND_SELECTOR, 30000) as st:
+                approve_btn = popup_page.get_by_role("button", name="Approve")
+                await approve_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await approve_btn.click(timeout=st.timeout_ms)
             logger.success('В popup нажата кнопка Approve')
             await asyncio.sleep(1)
 
@@ -496,7 +708,8 @@ class StartaleGMBrowser:
             mapping_url = f"{PROFILE_MAPPING_URL}?eoaAddress={eoa_address}"
             need_gasless = True
             try:
-                response = await page.request.get(mapping_url)
+                with trace.step("portal.mapping_check", KIND_API):
+                    response = await page.request.get(mapping_url)
                 if response.status == 404:
                     need_gasless = True
                 elif response.ok:
@@ -505,24 +718,30 @@ class StartaleGMBrowser:
                 logger.warning("Проверка profile/mapping не удалась: {}, выполняем Try gasless", e)
             if need_gasless:
                 logger.info("Смарт-аккаунт не создан, нажимаем Try gasless action на портале")
-                if "portal.soneium.org" not in page.url:
-                    await page.goto(PORTAL_URL, wait_until="domcontentloaded", timeout=60000)
-                else:
-                    await page.reload(wait_until="domcontentloaded", timeout=60000)
-                welcome_modal = page.locator('[role="dialog"][aria-labelledby="welcome-back-modal-title"]')
-                await welcome_modal.wait_for(state="visible", timeout=30000)
-                try_gasless_btn = page.get_by_role("button", name="Try gasless action")
-                await try_gasless_btn.wait_for(state="visible", timeout=10000)
-                async with context.expect_page(timeout=15000) as startale_popup_info:
-                    await try_gasless_btn.click()
-                logger.success('Нажата кнопка "Try gasless action" на основной странице портала')
-                startale_popup = await startale_popup_info.value
-                await startale_popup.wait_for_load_state("domcontentloaded", timeout=15000)
-                approve_gasless = startale_popup.get_by_role("button", name="Approve")
-                await approve_gasless.wait_for(state="visible", timeout=30000)
-                await approve_gasless.click()
+                with trace.step("portal.reload_portal", KIND_NAVIGATION, 60000) as st:
+                    if "portal.soneium.org" not in page.url:
+                        await page.goto(PORTAL_URL, wait_until="domcontentloaded", timeout=st.timeout_ms)
+                    else:
+                        await page.reload(wait_until="domcontentloaded", timeout=st.timeout_ms)
+                with trace.step("portal.welcome_modal", KIND_SELECTOR, 30000) as st:
+                    welcome_modal = page.locator('[role="dialog"][aria-labelledby="welcome-back-modal-title"]')
+                    await welcome_modal.wait_for(state="visible", timeout=st.timeout_ms)
+                with trace.step("portal.gasless_button", KIND_SELECTOR, 10000) as st:
+                    try_gasless_btn = page.get_by_role("button", name="Try gasless action")
+                    await try_gasless_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                with trace.step("portal.gasless_popup", KIND_POPUP, 15000) as st:
+                    async with context.expect_page(timeout=st.timeout_ms) as startale_popup_info:
+                        await try_gasless_btn.click(timeout=st.timeout_ms)
+                    logger.success('Нажата кнопка "Try gasless action" на основной странице портала')
+                    startale_popup = await startale_popup_info.value
+                    await startale_popup.wait_for_load_state("domcontentloaded", timeout=st.timeout_ms)
+                with trace.step("portal.gasless_approve", KIND_SELECTOR, 30000) as st:
+                    approve_gasless = startale_popup.get_by_role("button", name="Approve")
+                    await approve_gasless.wait_for(state="visible", timeout=st.timeout_ms)
+                    await approve_gasless.click(timeout=st.timeout_ms)
                 logger.success('В popup Startale нажата кнопка Approve (подпись gasless-транзакции)')
-                await page.goto(STARTALE_APP_URL, wait_until="domcontentloaded", timeout=60000)
+                with trace.step("portal.goto_app", KIND_NAVIGATION, 60000) as st:
+                    await page.goto(STARTALE_APP_URL, wait_until="domcontentloaded", timeout=st.timeout_ms)
                 logger.success("Открыта страница {}", STARTALE_APP_URL)
             else:
                 logger.info("Смарт-аккаунт уже создан (mapping 200), пропускаем Try gasless action")
@@ -530,60 +749,45 @@ class StartaleGMBrowser:
 
             # Если не на app.startale.com (например, пропустили Try gasless), переходим туда и выполняем GM
             if "app.startale.com" not in page.url:
-                await page.goto(STARTALE_APP_URL, wait_until="domcontentloaded", timeout=60000)
+                with trace.step("portal.goto_app", KIND_NAVIGATION, 60000) as st:
+                    await page.goto(STARTALE_APP_URL, wait_until="domcontentloaded", timeout=st.timeout_ms)
                 logger.success("Открыта страница {}", STARTALE_APP_URL)
             # На app.startale.com: ждём загрузки данных аккаунта, затем проверяем "Next GM available in"
             if "app.startale.com" in page.url:
-                await asyncio.sleep(WAIT_FOR_GM_DATA_SEC)
-                next_gm_visible = False
-                try:
-                    text = await _get_next_gm_text_from_page(page)
-                    if text and "Next GM available in" in text:
-                        next_gm_visible = True
-                        next_at = parse_next_gm_available(text)
-                        if next_at:
-                            db.upsert_account(eoa_address, next_gm_available_at=next_at)
-                            logger.success("Следующий GM доступен: {}", _format_next_gm_at(next_at))
-                except Exception:
-                    pass
-                if not next_gm_visible:
-                    try:
-                        send_gm_btn = page.get_by_role("button", name="Send GM back")
-                        await send_gm_btn.wait_for(state="visible", timeout=15000)
-                        await send_gm_btn.click(timeout=10000)
-                        logger.success('Нажата кнопка "Send GM back"')
-                        await page.locator("h2:has-text('GM sent!')").wait_for(state="visible", timeout=120000)
-                        logger.success('Появилось модальное окно "GM sent!"')
-                        try:
-                            text = await _get_next_gm_text_from_modal(page)
-                            next_at = parse_next_gm_available(text or "") if text else None
-                            if next_at:
-                                db.upsert_account(eoa_address, next_gm_available_at=next_at)
-                                logger.success("Следующий GM доступен: {}", _format_next_gm_at(next_at))
-                            else:
-                                fallback_at = datetime.now(timezone.utc) + timedelta(minutes=FALLBACK_GM_COOLDOWN_MINUTES)
-                                db.upsert_account(eoa_address, next_gm_available_at=fallback_at)
-                                logger.warning("Время из модалки не распознано, записан fallback: {}", _format_next_gm_at(fallback_at))
-                        except Exception:
-                            fallback_at = datetime.now(timezone.utc) + timedelta(minutes=FALLBACK_GM_COOLDOWN_MINUTES)
-                            db.upsert_account(eoa_address, next_gm_available_at=fallback_at)
-                            logger.warning("Не удалось прочитать время из модалки, записан fallback: {}", _format_next_gm_at(fallback_at))
-                    except Exception:
-                        logger.debug("Кнопка Send GM back не найдена или модалка не появилась")
+                await self._read_or_send_gm(page, eoa_address, "portal", gm_not_before)
             await asyncio.sleep(1)
         finally:
+            if context is not None:
+                await trace.detach(context, "portal")
+                await assetcache.detach(context, "portal")
             await playwright.stop()
 
-    async def _open_portal_login(self, cdp_endpoint: str, eoa_address: str) -> None:
-        """Открывает https://app.startale.com/log-in и подключает кошелёк (Connect a wallet → Rabby → Connect → Sign → Confirm)."""
+    async def _open_portal_login(
+        self,
+        cdp_endpoint: str,
+        eoa_address: str,
+        gm_not_before: Optional[float] = None,
+        connected_before: bool = False,
+        check_account: bool = False,
+    ) -> None:
+        """
+        Открывает https://app.startale.com/log-in и подключает кошелёк (Connect a wallet → Rabby → Connect → Sign → Confirm).
+        gm_not_before — см. _read_or_send_gm. connected_before — сайт уже подключался к Rabby в этом браузере
+        (пакетный режим), поэтому popup с Connect может не появиться. check_account — перед GM сверить
+        подключённый адрес с eoa_address (см. _check_connected_account).
+        """
         from playwright.async_api import async_playwright
 
+        trace = self.trace
         playwright = await async_playwright().start()
+        context = None
         try:
             browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
             if not browser.contexts:
                 raise RuntimeError("Нет контекстов в браузере")
             context = browser.contexts[0]
+            await trace.attach(context, "portal_login")
+            await assetcache.attach(context)
             page = None
             for p in context.pages:
                 if not p.url.startswith("chrome-extension://"):
@@ -591,93 +795,83 @@ class StartaleGMBrowser:
                     break
             if not page:
                 page = await context.new_page()
-            await page.goto(STARTALE_LOGIN_URL, wait_until="domcontentloaded", timeout=60000)
+            with trace.step("login.goto_login", KIND_NAVIGATION, 60000) as st:
+                await page.goto(STARTALE_LOGIN_URL, wait_until="domcontentloaded", timeout=st.timeout_ms)
             logger.success(f"Открыта страница: {STARTALE_LOGIN_URL}")
 
-            connect_btn = page.get_by_role("button", name="Connect a wallet")
-            await connect_btn.wait_for(state="visible", timeout=30000)
-            await connect_btn.click()
+            with trace.step("login.connect_a_wallet", KIND_SELECTOR, 30000) as st:
+                connect_btn = page.get_by_role("button", name="Connect a wallet")
+                await connect_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await connect_btn.click(timeout=st.timeout_ms)
             logger.success('Нажата кнопка "Connect a wallet"')
             await asyncio.sleep(2)
 
-            rabby_btn = page.get_by_role("button", name="Rabby")
-            await rabby_btn.wait_for(state="visible", timeout=30000)
-            async with context.expect_page() as wallet_popup_info:
-                await rabby_btn.click()
-            wallet_popup = await wallet_popup_info.value
-            await wallet_popup.wait_for_load_state("domcontentloaded", timeout=15000)
+            with trace.step("login.rabby_button", KIND_SELECTOR, 30000) as st:
+                rabby_btn = page.get_by_role("button", name="Rabby")
+                await rabby_btn.wait_for(state="visible", timeout=st.timeout_ms)
+            # Потолок — прежний таймаут Playwright по умолчанию (expect_page был без явного значения)
+            with trace.step("login.wallet_popup", KIND_POPUP, 30000) as st:
+                async with context.expect_page(timeout=st.timeout_ms) as wallet_popup_info:
+                    await rabby_btn.click(timeout=st.timeout_ms)
+                wallet_popup = await wallet_popup_info.value
+                await wallet_popup.wait_for_load_state("domcontentloaded", timeout=st.timeout_ms)
             logger.success("Открыто popup окно кошелька Rabby")
 
             connect_btn_wallet = wallet_popup.get_by_role("button", name="Connect")
-            await connect_btn_wallet.wait_for(state="visible", timeout=30000)
-            await connect_btn_wallet.click()
-            logger.success("Нажата кнопка Connect в popup кошелька")
-
-            sign_popup = await context.wait_for_event("page", timeout=30000)
-            await sign_popup.wait_for_load_state("domcontentloaded", timeout=15000)
-            logger.success("Открыт popup кошелька (Sign/Confirm)")
-
-            sign_btn = sign_popup.get_by_role("button", name="Sign")
-            await sign_btn.wait_for(state="visible", timeout=30000)
-            await sign_btn.click()
+            sign_popup = None
+            if connected_before:
+                # Сайт уже подключён к Rabby (пакетный режим): Connect не спрашивается, первый popup — сразу Sign
+                try:
+                    await connect_btn_wallet.wait_for(state="visible", timeout=BATCH_CONNECT_PROBE_MS)
+                except Exception:
+                    sign_popup = wallet_popup
+                    logger.info("Rabby не спросил Connect — сайт уже подключён, сразу подпись")
+            if sign_popup is None:
+                with trace.step("login.wallet_connect", KIND_SELECTOR, 30000) as st:
+                    await connect_btn_wallet.wait_for(state="visible", timeout=st.timeout_ms)
+                    await connect_btn_wallet.click(timeout=st.timeout_ms)
+                logger.success("Нажата кнопка Connect в popup кошелька")
+
+                with trace.step("login.sign_popup", KIND_POPUP, 30000) as st:
+                    sign_popup = await context.wait_for_event("page", timeout=st.timeout_ms)
+                    await sign_popup.wait_for_load_state("domcontentloaded", timeout=st.timeout_ms)
+                logger.success("Открыт popup кошелька (Sign/Confirm)")
+
+            with trace.step("login.sign", KIND_SELECTOR, 30000) as st:
+                sign_btn = sign_popup.get_by_role("button", name="Sign")
+                await sign_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await sign_btn.click(timeout=st.timeout_ms)
             logger.success("Нажата кнопка Sign в popup кошелька")
             await asyncio.sleep(1)
 
-            confirm_btn = sign_popup.get_by_role("button", name="Confirm")
-            await confirm_btn.wait_for(state="visible", timeout=30000)
-            await confirm_btn.click()
+            with trace.step("login.confirm", KIND_SELECTOR, 30000) as st:
+                confirm_btn = sign_popup.get_by_role("button", name="Confirm")
+                await confirm_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                await confirm_btn.click(timeout=st.timeout_ms)
             logger.success("Нажата кнопка Confirm в popup кошелька")
             await asyncio.sleep(1)
 
             approve_btn = page.get_by_role("button", name="Approve")
             try:
-                await approve_btn.wait_for(state="visible", timeout=10000)
-                await approve_btn.click()
+                with trace.step("login.approve", KIND_SELECTOR, 10000) as st:
+                    await approve_btn.wait_for(state="visible", timeout=st.timeout_ms)
+                    await approve_btn.click(timeout=st.timeout_ms)
                 logger.success("Нажата кнопка Approve на странице log-in")
             except Exception:
                 pass
             await asyncio.sleep(1)
 
-            await page.goto(STARTALE_APP_URL, wait_until="domcontentloaded", timeout=60000)
+            with trace.step("login.goto_app", KIND_NAVIGATION, 60000) as st:
+                await page.goto(STARTALE_APP_URL, wait_until="domcontentloaded", timeout=st.timeout_ms)
             logger.success("Открыта страница {}", STARTALE_APP_URL)
-            await asyncio.sleep(WAIT_FOR_GM_DATA_SEC)
-            next_gm_visible = False
-            try:
-                text = await _get_next_gm_text_from_page(page)
-                if text and "Next GM available in" in text:
-                    next_gm_visible = True
-                    next_at = parse_next_gm_available(text)
-                    if next_at:
-                        db.upsert_account(eoa_address, next_gm_available_at=next_at)
-                        logger.success("Следующий GM доступен: {}", _format_next_gm_at(next_at))
-            except Exception:
-                pass
-            if not next_gm_visible:
-                try:
-                    send_gm_btn = page.get_by_role("button", name="Send GM back")
-                    await send_gm_btn.wait_for(state="visible", timeout=15000)
-                    await send_gm_btn.click(timeout=10000)
-                    logger.success('Нажата кнопка "Send GM back"')
-                    await page.locator("h2:has-text('GM sent!')").wait_for(state="visible", timeout=120000)
-                    logger.success('Появилось модальное окно "GM sent!"')
-                    try:
-                        text = await _get_next_gm_text_from_modal(page)
-                        next_at = parse_next_gm_available(text or "") if text else None
-                        if next_at:
-                            db.upsert_account(eoa_address, next_gm_available_at=next_at)
-                            logger.success("Следующий GM доступен: {}", _format_next_gm_at(next_at))
-                        else:
-                            fallback_at = datetime.now(timezone.utc) + timedelta(minutes=FALLBACK_GM_COOLDOWN_MINUTES)
-                            db.upsert_account(eoa_address, next_gm_available_at=fallback_at)
-                            logger.warning("Время из модалки не распознано, записан fallback: {}", _format_next_gm_at(fallback_at))
-                    except Exception:
-                        fallback_at = datetime.now(timezone.utc) + timedelta(minutes=FALLBACK_GM_COOLDOWN_MINUTES)
-                        db.upsert_account(eoa_address, next_gm_available_at=fallback_at)
-                        logger.warning("Не удалось прочитать время из модалки, записан fallback: {}", _format_next_gm_at(fallback_at))
-                except Exception:
-                    logger.debug("Кнопка Send GM back не найдена или модалка не появилась")
+            if check_account:
+                await self._check_connected_account(page, eoa_address)
+            await self._read_or_send_gm(page, eoa_address, "login", gm_not_before)
             await asyncio.sleep(1)
         finally:
+            if context is not None:
+                await trace.detach(context, "portal_login")
+                await assetcache.detach(context, "portal_login")
             await playwright.stop()
 
     def run_one(
@@ -686,33 +880,79 @@ class StartaleGMBrowser:
         wallet_password: str = "Password123",
         use_proxy: bool = True,
         wait_for_user: bool = True,
+        resume: Optional[dict] = None,
+        run_id: Optional[str] = None,
+        gm_not_before: Optional[float] = None,
+        private_key: Optional[str] = None,
     ) -> bool:
-        """Один цикл: профиль → браузер → импорт кошелька → открытие Portal. При wait_for_user=False не ждёт Enter."""
+        """
+        Один цикл: профиль → браузер → импорт кошелька → открытие Portal. При wait_for_user=False не ждёт Enter.
+        resume — запись журнала незавершённого запуска (modules/journal.py): если её браузер ещё жив и кошелёк
+        уже импортирован, переподключаемся к нему; иначе брошенный профиль удаляется и запуск идёт с нуля.
+        run_id — идентификатор запуска из журнала; им же называются файлы трейса в traces/.
+        gm_not_before — срок GM (epoch), если запуск начат заранее (lookahead): всё до кнопки GM делается сразу,
+        а сама кнопка нажимается к сроку.
+        private_key — ключ из реестра мониторинга; без него ключ читается из keys.txt по key_index.
+        """
+        self.current_step = None
+        self.current_flow = None
+        self.gm_clicked_at = None
+        address: Optional[str] = None
         try:
-            private_key = load_private_key(key_index=key_index)
-            address = Web3.to_checksum_address(Web3().eth.account.from_key(private_key).address)
+            self.current_step = "load_key"
+            private_key = private_key or load_private_key(key_index=key_index)
+            address = evm.private_key_to_address(private_key)
             logger.info(f"Кошелёк: {address}")
+            self.trace = perftrace.RunTrace(
+                run_id or uuid.uuid4().hex[:12], address, capture=perftrace.should_capture(address)
+            )
+            if self.trace.capture:
+                logger.info("Для запуска пишется трейс производительности ({})", self.trace.run_id)
 
-            self.create_temp_profile(use_proxy=use_proxy)
-            browser_info = self.start_browser(self.profile_id)
-            time.sleep(5)
-
-            cdp = _get_cdp_endpoint(browser_info)
+            cdp = self.cleanup_or_reattach(resume) if resume else None
             if not cdp:
-                raise RuntimeError("Не удалось получить CDP endpoint от AdsPower")
-
-            asyncio.run(
-                self._import_wallet(cdp, private_key, password=wallet_password)
-            )
-            has_smart = check_smart_account_exists(address)
-            db.upsert_account(address, smart_account_created=has_smart)
+                journal.begin(address, key_index)
+                self.current_step = "create_profile"
+                with self.trace.step("create_profile", KIND_API):
+                    self.create_temp_profile(use_proxy=use_proxy)
+                journal.update(address, journal.PHASE_PROFILE_CREATED, profile_id=self.profile_id)
+                self.current_step = "start_browser"
+                with self.trace.step("start_browser", KIND_API):
+                    browser_info = self.start_browser(self.profile_id)
+                with self.trace.step("browser_warmup", KIND_SLEEP):
+                    time.sleep(5)
+
+                cdp = _get_cdp_endpoint(browser_info)
+                if not cdp:
+                    raise RuntimeError("Не удалось получить CDP endpoint от AdsPower")
+                journal.update(address, journal.PHASE_BROWSER_STARTED, cdp_endpoint=cdp)
+
+                self.current_step = "import_wallet"
+                asyncio.run(
+                    self._import_wallet(cdp, private_key, password=wallet_password)
+                )
+                journal.update(address, journal.PHASE_WALLET_IMPORTED)
+            self.current_step = "check_smart_account"
+            with self.trace.step("check_smart_account", KIND_API):
+                has_smart = check_smart_account_exists(address)
+            if has_smart is None:
+                # Ответа нет: берём последнее известное значение, а не отправляем аккаунт в долгий полный flow
+                info = db.get_account_info(address)
+                has_smart = bool(info and info["smart_account_created"])
+                logger.warning("profile/mapping недоступен, по сохранённым данным смарт-аккаунт: {}",
+                               "есть" if has_smart else "нет")
+            else:
+                db.upsert_account(address, smart_account_created=has_smart)
             if has_smart:
                 logger.info("Смарт-аккаунт уже создан, переходим на log-in и подключаемся")
-                asyncio.run(self._open_portal_login(cdp, address))
+                self.current_step = self.current_flow = "portal_login"
+                asyncio.run(self._open_portal_login(cdp, address, gm_not_before))
             else:
                 logger.info("Смарт-аккаунт не создан, выполняем полный flow через портал")
-                asyncio.run(self._open_portal(cdp, address))
+                self.current_step = self.current_flow = "portal"
+                asyncio.run(self._open_portal(cdp, address, gm_not_before))
                 db.upsert_account(address, smart_account_created=True)
+            self.current_step = "done"
 
             if wait_for_user:
                 logger.info("Готово. Закройте браузер вручную или нажмите Enter для остановки профиля.")
@@ -725,25 +965,218 @@ class StartaleGMBrowser:
             if self.profile_id:
                 self.stop_browser(self.profile_id)
                 self.delete_profile(self.profile_id)
+            if address:
+                journal.finish(address)
+                try:
+                    self.trace.finish()
+                except Exception as e:
+                    logger.warning("Не удалось сохранить трейс запуска: {}", e)
+
+    def cleanup_or_reattach(self, entry: dict) -> Optional[str]:
+        """
+        Переподключение к браузеру незавершённого запуска из журнала.
+        Возвращает CDP endpoint, если браузер жив и кошелёк уже импортирован (self.profile_id = профиль записи).
+        Иначе останавливает и удаляет брошенный профиль и возвращает None.
+        """
+        pid = entry.get("profile_id")
+        if not pid:
+            return None
+        self.profile_id = pid
+        status = self.get_browser_status(pid)
+        if status and journal.phase_reached(entry, journal.PHASE_WALLET_IMPORTED):
+            cdp = _get_cdp_endpoint(status) or entry.get("cdp_endpoint")
+            if cdp:
+                logger.info("Переподключение к живому браузеру профиля {} (фаза: {})", pid, entry.get("phase"))
+                return cdp
+        logger.info("Очистка брошенного профиля {} (фаза: {}, браузер {})",
+                    pid, entry.get("phase"), "активен" if status else "не активен")
+        self.stop_browser(pid)
+        self.delete_profile(pid)
+        self.profile_id = None
+        return None
+
+    # --- пакетный режим: несколько кошельков в одном браузере ---
+
+    async def _import_extra_wallet(self, cdp_endpoint: str, private_key: str) -> None:
+        """
+        Добавляет ещё один ключ в уже настроенный Rabby (страница добавления адреса). Rabby делает
+        импортированный адрес текущим, так что следующее подключение сайта идёт от его имени.
+        """
+        from playwright.async_api import async_playwright
+
+        trace = self.trace
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
+            if not browser.contexts:
+                raise RuntimeError("Нет контекстов в браузере")
+            context = browser.contexts[0]
+            page = await context.new_page()
+            with trace.step("batch.goto_import_key", KIND_NAVIGATION, 30000) as st:
+                await page.goto(f"chrome-extension://{RABBY_EXTENSION_ID}/index.html#/import/key", timeout=st.timeout_ms)
+            with trace.step("batch.private_key_input", KIND_SELECTOR, 30000) as st:
+                key_input = page.locator("#privateKey, #key, textarea").first
+                await key_input.wait_for(state="visible", timeout=st.timeout_ms)
+                await key_input.fill(private_key)
+            with trace.step("batch.confirm_key", KIND_SELECTOR, 30000) as st:
+                await page.click('button:has-text("Confirm"):not([disabled])', timeout=st.timeout_ms)
+            with trace.step("batch.import_success", KIND_SELECTOR, 30000) as st:
+                await page.get_by_text(re.compile("Imported Successfully|Added successfully", re.I)).first.wait_for(
+                    state="visible", timeout=st.timeout_ms
+                )
+            logger.success("Кошелёк добавлен в Rabby и выбран текущим")
+            await page.close()
+        finally:
+            await playwright.stop()
+
+    async def _check_connected_account(self, page, eoa_address: str) -> None:
+        """
+        Сверяет адрес, которым подключён сайт (eth_accounts провайдера Rabby на странице), с eoa_address.
+        Несовпадение — исключение: иначе срок GM другого кошелька записался бы в БД этому аккаунту.
+        """
+        with self.trace.step("batch.check_account", KIND_SELECTOR, 15000) as st:
+            await page.wait_for_function("() => !!window.ethereum", timeout=st.timeout_ms)
+            accounts = await page.evaluate("() => window.ethereum.request({ method: 'eth_accounts' })")
+        current = str(accounts[0]) if accounts else None
+        if not current or current.lower() != eoa_address.lower():
+            raise RuntimeError(f"Сайт подключён другим кошельком ({current or 'нет адреса'}), ожидался {eoa_address}")
+        logger.info("Сайт подключён нужным кошельком")
+
+    async def _clear_site_data(self, cdp_endpoint: str) -> None:
+        """Стирает данные app.startale.com (cookies, localStorage, IndexedDB), чтобы сайт заново запросил кошелёк."""
+        from playwright.async_api import async_playwright
+
+        playwright = await async_playwright().start()
+        try:
+            browser = await playwright.chromium.connect_over_cdp(cdp_endpoint)
+            if not browser.contexts:
+                raise RuntimeError("Нет контекстов в браузере")
+            context = browser.contexts[0]
+            page = next((p for p in context.pages if not p.url.startswith("chrome-extension://")), None)
+            if page is None:
+                page = await context.new_page()
+            session = await context.new_cdp_session(page)
+            with self.trace.step("batch.clear_site_data", KIND_API):
+                for origin in BATCH_CLEAR_ORIGINS:
+                    await session.send("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+            await session.detach()
+        finally:
+            await playwright.stop()
+
+    def run_batch_member(
+        self,
+        batch: list[dict],
+        index: int,
+        run_id: str,
+        wallet_password: str = "Password123",
+        use_proxy: bool = True,
+    ) -> None:
+        """
+        Один кошелёк пакета (batch — элементы {"address", "key_index", "private_key", "gm_not_before"}).
+        Для первого создаются профиль и браузер (self.batch_cdp) и делается обычный импорт в Rabby; для следующих —
+        добавление ключа в Rabby и очистка данных сайта. Дальше — сценарий portal_login в том же браузере;
+        перед GM проверяется, что сайт подключён именно этим кошельком (иначе — исключение и запуск по одному).
+        Профиль останавливается и удаляется в close_batch().
+        """
+        member = batch[index]
+        address = member["address"]
+        logger.info("Кошелёк: {} (пакет, {} из {})", address, index + 1, len(batch))
+        self.current_step = None
+        self.current_flow = None
+        self.gm_clicked_at = None
+        self.trace = perftrace.RunTrace(run_id, address, capture=perftrace.should_capture(address))
+        try:
+            if index == 0:
+                for m in batch:
+                    journal.begin(m["address"], m["key_index"])
+                self.current_step = "create_profile"
+                with self.trace.step("create_profile", KIND_API):
+                    self.create_temp_profile(use_proxy=use_proxy)
+                for m in batch:
+                    journal.update(m["address"], journal.PHASE_PROFILE_CREATED, profile_id=self.profile_id)
+                self.current_step = "start_browser"
+                with self.trace.step("start_browser", KIND_API):
+                    browser_info = self.start_browser(self.profile_id)
+                with self.trace.step("browser_warmup", KIND_SLEEP):
+                    time.sleep(5)
+                cdp = _get_cdp_endpoint(browser_info)
+                if not cdp:
+                    raise RuntimeError("Не удалось получить CDP endpoint от AdsPower")
+                # Фазу WALLET_IMPORTED не пишем: после падения такой профиль удаляется, аккаунты идут заново по одному
+                for m in batch:
+                    journal.update(m["address"], journal.PHASE_BROWSER_STARTED, cdp_endpoint=cdp)
+                self.batch_cdp = cdp
+                self.current_step = "import_wallet"
+                asyncio.run(self._import_wallet(cdp, member["private_key"], password=wallet_password))
+            else:
+                if not self.batch_cdp:
+                    raise RuntimeError("Браузер пакета не запущен")
+                self.current_step = "import_extra_wallet"
+                asyncio.run(self._import_extra_wallet(self.batch_cdp, member["private_key"]))
+                self.current_step = "clear_site_data"
+                asyncio.run(self._clear_site_data(self.batch_cdp))
+            self.current_step = self.current_flow = "portal_login"
+            asyncio.run(
+                self._open_portal_login(
+                    self.batch_cdp, address, member["gm_not_before"], connected_before=index > 0, check_account=True
+                )
+            )
+            self.current_step = "done"
+        finally:
+            try:
+                self.trace.finish()
+            except Exception as e:
+                logger.warning("Не удалось сохранить трейс запуска: {}", e)
+
+    def close_batch(self, batch: list[dict]) -> None:
+        """Останавливает и удаляет профиль пакета, снимает записи журнала незавершённых запусков."""
+        if self.profile_id:
+            self.stop_browser(self.profile_id)
+            self.delete_profile(self.profile_id)
+        self.batch_cdp = None
+        for m in batch:
+            journal.finish(m["address"])
 
 
 MONITOR_INTERVAL_SEC = 10
+# Сколько аккаунтов обрабатывать параллельно (каждый запуск — свой профиль AdsPower)
+MONITOR_WORKERS = 1
+# Потоков в пуле не больше этого (фактический лимит — workers / адаптивный контроллер / команда concurrency)
+MONITOR_MAX_WORKERS = 64
+MONITOR_POLICY = POLICY_EDF
+# За сколько секунд до срока GM начинать запуск (подготовка профиля/кошелька до кнопки GM); 0 — по сроку
+MONITOR_LOOKAHEAD_SEC = 90
+# Как часто публиковать очередь планировщика в метрики (раздел "scheduler")
+SCHEDULER_METRICS_INTERVAL_SEC = 5.0
+# Пакетный режим: до стольких аккаунтов с готовым смарт-аккаунтом в одном браузере; 1 — выключен
+MONITOR_BATCH_SIZE = 1
+MONITOR_MAX_BATCH_SIZE = 10
+# Сколько «должных» аккаунтов просматривать на одно место в пакете при его подборе
+BATCH_SCAN_FACTOR = 4
 SPINNER_CHARS = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
 SPINNER_INTERVAL = 0.12
 
 
-def _wait_with_spinner(seconds: float, message: str = "Ожидание следующей проверки") -> None:
-    """Ждёт указанное время, показывая спиннер в консоли. Прерывается по Ctrl+C."""
-    import sys
+def _wait_with_spinner(
+    seconds: float, message: str = "Ожидание следующей проверки", wake: Optional[threading.Event] = None
+) -> None:
+    """
+    Ждёт указанное время, показывая спиннер в консоли. Прерывается по Ctrl+C и досрочно — по событию wake.
+    Если stderr не терминал (перенаправлен в файл/journald), спиннер не рисуется — просто ждём.
+    """
+    wake = wake or threading.Event()
+    if not sys.stderr.isatty():
+        wake.wait(seconds)
+        return
     end = time.time() + seconds
     i = 0
     try:
-        while time.time() < end:
+        while time.time() < end and not wake.is_set():
             left = max(0, int(end - time.time()))
             char = SPINNER_CHARS[i % len(SPINNER_CHARS)]
             sys.stderr.write(f"\r  {char} {message}... ({left} с)   ")
             sys.stderr.flush()
-            time.sleep(min(SPINNER_INTERVAL, end - time.time()))
+            wake.wait(max(0.0, min(SPINNER_INTERVAL, end - time.time())))
             i += 1
     except KeyboardInterrupt:
         raise
@@ -752,15 +1185,28 @@ def _wait_with_spinner(seconds: float, message: str = "Ожидание след
         sys.stderr.flush()
 
 
-def run() -> None:
-    """Точка входа: запуск мониторинга по БД (GM по расписанию для всех аккаунтов из keys.txt)."""
-    logger.remove()
-    logger.add(
-        sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
-        level="INFO",
-    )
+def run(
+    started_at: Optional[float] = None,
+    workers: int = MONITOR_WORKERS,
+    policy: str = MONITOR_POLICY,
+    asset_cache: bool = False,
+    lookahead: float = MONITOR_LOOKAHEAD_SEC,
+    adaptive: bool = False,
+    batch: int = MONITOR_BATCH_SIZE,
+) -> None:
+    """
+    Точка входа: запуск мониторинга по БД (GM по расписанию для всех аккаунтов из keys.txt).
+    started_at — time.perf_counter() в момент старта процесса, для лога времени холодного старта.
+    workers — сколько аккаунтов обрабатывать параллельно, policy — политика планировщика ("edf"/"poll").
+    asset_cache — включить общий кэш статических ассетов (modules/assetcache.py).
+    lookahead — за сколько секунд до срока GM начинать запуск аккаунта.
+    adaptive — подбирать число параллельных запусков по нагрузке хоста (workers — максимум).
+    batch — размер пакета: аккаунты с готовым смарт-аккаунтом обрабатываются по batch в одном браузере.
+    """
+    setup_logging()
     try:
+        if asset_cache:
+            assetcache.enable()
         api_key = load_adspower_api_key()
         all_keys = load_all_keys()
         logger.info(f"Загружено ключей: {len(all_keys)}")
@@ -769,52 +1215,521 @@ def run() -> None:
             return
         db.init_db()
         manager = StartaleGMBrowser(api_key=api_key)
-        run_monitor(manager, all_keys)
+        run_monitor(manager, all_keys, started_at=started_at, workers=workers, policy=policy, lookahead=lookahead,
+                    adaptive=adaptive, batch_size=batch)
     except FileNotFoundError as e:
         logger.error(str(e))
         raise SystemExit(1)
     except ValueError as e:
         logger.error(str(e))
         raise SystemExit(1)
+    finally:
+        logger.complete()
+
+
+@contextmanager
+def _recorded_run(
+    manager: StartaleGMBrowser,
+    addr: str,
+    key_index: int,
+    resume: Optional[dict] = None,
+    gm_not_before: Optional[float] = None,
+    batch_id: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Обёртка запуска аккаунта: отдаёт run_id и по выходе дописывает результат в журнал запусков (modules/history.py) —
+    плановое время (next_gm_available_at до запуска), старт/финиш, исход и шаг, на котором упало.
+    Внутри address/run_id попадают в каждую строку лога. Исключения пробрасываются дальше.
+    """
+    info = db.get_account_info(addr)
+    due_at = info.get("next_gm_available_at") if info else None
+    started = datetime.now(timezone.utc)
+    run_id = uuid.uuid4().hex[:12]
+    record: dict[str, Any] = {
+        "run_id": run_id,
+        "address": addr,
+        "key_index": key_index,
+        "due_at": due_at,
+        "started_at": started.isoformat(),
+        "resumed": bool(resume),
+        "prewarmed": gm_not_before is not None,
+        "batch_id": batch_id,
+    }
+    outcome = history.OUTCOME_FAILED
+    error: Optional[str] = None
+    try:
+        # address/run_id попадают в каждую строку лога этого запуска (в т.ч. из asyncio-задач сценария)
+        with logger.contextualize(address=addr, run_id=run_id):
+            yield run_id
+        outcome = history.OUTCOME_NO_GM
+    except KeyboardInterrupt:
+        outcome = history.OUTCOME_INTERRUPTED
+        raise
+    except Exception as e:
+        error = str(e)[:500]
+        raise
+    finally:
+        finished = datetime.now(timezone.utc)
+        info = db.get_account_info(addr)
+        next_gm_at = info.get("next_gm_available_at") if info else None
+        if outcome == history.OUTCOME_NO_GM and next_gm_at and next_gm_at != due_at:
+            try:
+                if datetime.fromisoformat(next_gm_at.replace("Z", "+00:00")) > finished:
+                    outcome = history.OUTCOME_OK
+            except ValueError:
+                pass
+        record.update(
+            {
+                "finished_at": finished.isoformat(),
+                "duration_sec": round((finished - started).total_seconds(), 3),
+                "flow": manager.current_flow,
+                "outcome": outcome,
+                "failed_step": manager.current_step if outcome == history.OUTCOME_FAILED else None,
+                "error": error,
+                "next_gm_at": next_gm_at,
+                "gm_at": manager.gm_clicked_at.isoformat() if manager.gm_clicked_at else None,
+                "traced": manager.trace.run_id == run_id and manager.trace.capture,
+            }
+        )
+        try:
+            history.append_run(record)
+        except OSError as e:
+            logger.warning("Не удалось записать журнал запусков: {}", e)
+
+
+def _run_account_recorded(
+    manager: StartaleGMBrowser,
+    addr: str,
+    key_index: int,
+    resume: Optional[dict] = None,
+    gm_not_before: Optional[float] = None,
+    private_key: Optional[str] = None,
+) -> None:
+    """Запускает run_one для аккаунта с записью в журнал запусков. Исключения пробрасываются дальше."""
+    with _recorded_run(manager, addr, key_index, resume=resume, gm_not_before=gm_not_before) as run_id:
+        manager.run_one(
+            key_index=key_index,
+            wait_for_user=False,
+            resume=resume,
+            run_id=run_id,
+            gm_not_before=gm_not_before,
+            private_key=private_key,
+        )
 
 
-def run_monitor(manager: StartaleGMBrowser, all_keys: list[str]) -> None:
-    """Постоянно проверяет БД: для аккаунтов, у которых наступило время GM, запускает run_one."""
-    known_addresses = []
-    for i in range(len(all_keys)):
-        try:
-            addr = get_address_for_key_index(i)
-            known_addresses.append(addr)
-        except Exception:
-            pass
-    if not known_addresses:
-        logger.error("Не удалось получить адреса из ключей")
-        return
-    logger.info("Мониторинг запущен (интервал {} с). Остановка: Ctrl+C.", MONITOR_INTERVAL_SEC)
-    while True:
-        current_addr = None  # чтобы в except знать, какой аккаунт отложить при лимите AdsPower
-        try:
-            due = db.get_accounts_due_for_gm(known_addresses)
-            if due:
-                addr = due[0]
-                current_addr = addr
-                key_index = get_key_index_for_address(addr, all_keys)
-                if key_index is not None:
-                    logger.info("Запуск аккаунта для GM: {} (ключ #{})", addr, key_index + 1)
-                    manager.run_one(key_index=key_index, wait_for_user=False)
-                else:
-                    logger.warning("Адрес {} не найден среди ключей", addr)
+def _run_account_job(
+    manager: StartaleGMBrowser,
+    addr: str,
+    key_index: int,
+    resume: Optional[dict] = None,
+    gm_not_before: Optional[float] = None,
+    private_key: Optional[str] = None,
+) -> None:
+    """Запуск аккаунта в потоке воркера: у каждого запуска свой экземпляр (profile_id, trace, шаг — на запуск)."""
+    worker = StartaleGMBrowser(api_key=manager.api_key, base_url=manager.base_url, timeout=manager.timeout)
+    _run_account_recorded(
+        worker, addr, key_index, resume=resume, gm_not_before=gm_not_before, private_key=private_key
+    )
+
+
+def _run_batch_recorded(manager: StartaleGMBrowser, batch: list[dict]) -> tuple[list[str], Optional[BaseException]]:
+    """
+    Пакет кошельков в одном браузере (см. StartaleGMBrowser.run_batch_member), каждый — со своей записью
+    в журнале запусков (общий batch_id). Ошибка останавливает пакет: возвращаются адреса, которые
+    нужно запустить по одному (упавший и необработанные), и сама ошибка.
+    """
+    batch_id = uuid.uuid4().hex[:12]
+    logger.info("Пакет {}: {} кошельков в одном браузере", batch_id, len(batch))
+    done = 0
+    try:
+        for i, member in enumerate(batch):
+            with _recorded_run(
+                manager, member["address"], member["key_index"], gm_not_before=member["gm_not_before"], batch_id=batch_id
+            ) as run_id:
+                manager.run_batch_member(batch, i, run_id)
+            done += 1
+    except Exception as e:
+        _log_job_error(batch[done]["address"], e)
+        rest = [m["address"] for m in batch[done:]]
+        logger.warning("Пакет {} прерван, по одному будут запущены: {}", batch_id, ", ".join(rest))
+        return rest, e
+    finally:
+        manager.close_batch(batch)
+    return [], None
+
+
+def _run_batch_job(manager: StartaleGMBrowser, batch: list[dict]) -> tuple[list[str], Optional[BaseException]]:
+    """Пакет в потоке воркера: свой экземпляр StartaleGMBrowser на пакет."""
+    worker = StartaleGMBrowser(api_key=manager.api_key, base_url=manager.base_url, timeout=manager.timeout)
+    return _run_batch_recorded(worker, batch)
+
+
+def _is_adspower_limit(err_msg: str) -> bool:
+    return "Exceeding import daily limit" in err_msg or "recovery after" in err_msg.lower()
+
+
+def _is_timeout_error(e: BaseException) -> bool:
+    """Запуск упал по таймауту шага (Playwright TimeoutError / «Timeout ... exceeded»)."""
+    return type(e).__name__ == "TimeoutError" or "Timeout" in str(e)
+
+
+def _log_job_error(addr: str, e: BaseException) -> None:
+    err_msg = str(e)
+    if _is_adspower_limit(err_msg):
+        # При лимите AdsPower профили просто пропускаем: расписание next_gm_available_at не трогаем,
+        # чтобы его не смещать искусственно на 10 часов.
+        logger.warning("Лимит AdsPower (создание профилей). Аккаунт {} пропущен.", addr)
+    else:
+        logger.error("Ошибка мониторинга ({}): {}", addr, err_msg)
+
+
+def _next_due_ts(addr: str) -> Optional[float]:
+    """Срок следующего запуска по БД; None — запуск его не сдвинул в будущее (ошибка, лимит AdsPower)."""
+    next_at = db.get_next_gm_times([addr]).get(addr)
+    due_ts = next_at.timestamp() if next_at else None
+    return due_ts if due_ts is not None and due_ts > time.time() else None
+
+
+class Monitor:
+    """
+    Цикл мониторинга GM. Расписание из БД загружается в планировщик (modules/scheduler.py) один раз,
+    дальше аккаунты выдаются по сроку в пул воркеров; после запуска срок берётся из БД заново.
+    keys.txt перечитывается при изменении (в план добавляются только новые ключи), команды управляющего
+    сокета (modules/control.py) исполняются в этом же потоке между итерациями цикла.
+    При batch_size > 1 «должные» аккаунты с уже созданным смарт-аккаунтом объединяются в пакеты:
+    один профиль и браузер на пакет, кошельки переключаются в Rabby (см. run_batch_member).
+    """
+
+    def __init__(
+        self,
+        manager: StartaleGMBrowser,
+        workers: int = MONITOR_WORKERS,
+        policy: str = MONITOR_POLICY,
+        lookahead: float = MONITOR_LOOKAHEAD_SEC,
+        adaptive: bool = False,
+        batch_size: int = MONITOR_BATCH_SIZE,
+    ):
+        self.manager = manager
+        self.registry = KeyRegistry(KEYS_PATH, load_all_keys)
+        self.workers = max(1, min(workers, MONITOR_MAX_WORKERS))
+        self.policy = policy
+        self.lookahead = lookahead
+        self.sched = Scheduler(policy=policy, poll_interval=MONITOR_INTERVAL_SEC)
+        self.controller = ConcurrencyController(max_limit=self.workers) if adaptive else None
+        self._executor = futures.ThreadPoolExecutor(max_workers=MONITOR_MAX_WORKERS, thread_name_prefix="gm-worker")
+        self.batch_size = max(1, min(batch_size, MONITOR_MAX_BATCH_SIZE))
+        # Запуск — один аккаунт или пакет; значение — его адреса
+        self.running: dict[futures.Future, list[str]] = {}
+        # Аккаунты, на которых пакет прервался: следующий запуск — отдельным профилем
+        self._single_only: set[str] = set()
+        # Повторы после запуска, не сдвинувшего срок: адрес -> время повтора (см. _reschedule)
+        self._retry_at: dict[str, float] = {}
+        # Запуски, прерванные падением процесса: выполняются первыми, не дожидаясь своего срока
+        self.resume_entries: dict[str, dict] = {}
+        self.paused = False
+        self.draining = False
+        self._wake = threading.Event()
+        self._commands: queue.Queue = queue.Queue()
+        self._state_published = float("-inf")
+
+    @property
+    def limit(self) -> int:
+        return self.controller.limit if self.controller else self.workers
+
+    def _running_addresses(self) -> set[str]:
+        return {addr for addrs in self.running.values() for addr in addrs}
+
+    def _schedule(self, addresses: list[str]) -> None:
+        now = time.time()
+        for addr, next_at in db.get_next_gm_times(addresses).items():
+            self.sched.add(addr, next_at.timestamp() if next_at else now, order=self.registry.key_index(addr))
+
+    def _reschedule(self, addr: str) -> None:
+        """
+        Ставит аккаунт в план после запуска. Если срок GM не сдвинулся, это повтор через RETRY_DELAY_SEC:
+        в планировщик он идёт со сдвигом на lookahead, чтобы окно упреждения не выдало его сразу же
+        (иначе ошибка вроде лимита AdsPower превращается в непрерывные попытки), и запускается без упреждения.
+        """
+        due_ts = _next_due_ts(addr)
+        if due_ts is None:
+            retry_ts = time.time() + RETRY_DELAY_SEC
+            self._retry_at[addr] = retry_ts
+            due_ts = retry_ts + self.lookahead
+        else:
+            self._retry_at.pop(addr, None)
+        self.sched.add(addr, due_ts, order=self.registry.key_index(addr))
+
+    def _reload_keys(self) -> None:
+        changes = self.registry.reload_if_changed()
+        if not changes:
+            return
+        added, removed = changes
+        running = self._running_addresses()
+        for addr in removed:
+            self.sched.remove(addr)
+            self.resume_entries.pop(addr, None)
+            self._retry_at.pop(addr, None)
+        # Порядок ключей в файле мог измениться — обновляем его и у уже запланированных (для политики poll)
+        for addr in self.registry.addresses():
+            due_ts = self.sched.due_ts(addr)
+            if due_ts is not None:
+                self.sched.add(addr, due_ts, order=self.registry.key_index(addr))
+        self._schedule([a for a in added if a not in running])
+        logger.info("keys.txt перечитан: добавлено {}, удалено {}, всего адресов {}", len(added), len(removed),
+                    len(self.registry))
+
+    def _restore_inflight(self) -> None:
+        for entry in journal.load_inflight():
+            addr = entry["eoa_address"]
+            if addr in self.registry:
+                self.resume_entries[addr] = entry
+                self.sched.add(addr, 0.0)
             else:
-                _wait_with_spinner(MONITOR_INTERVAL_SEC)
+                logger.warning("Незавершённый запуск для неизвестного адреса {}, очищаем профиль", addr)
+                self.manager.cleanup_or_reattach({**entry, "phase": journal.PHASE_STARTED})
+                journal.finish(addr)
+        if self.resume_entries:
+            logger.info("Найдено незавершённых запусков: {}", len(self.resume_entries))
+
+    # --- управляющий сокет ---
+
+    def submit_command(self, cmd: str, args: list[str]) -> dict[str, Any]:
+        """Вызывается из потока сокета: передаёт команду циклу мониторинга и ждёт ответ."""
+        done = threading.Event()
+        slot: dict[str, Any] = {}
+        self._commands.put((cmd, args, slot, done))
+        self._wake.set()
+        if not done.wait(CONTROL_TIMEOUT_SEC):
+            return {"ok": False, "error": "мониторинг не ответил"}
+        return slot["response"]
+
+    def _process_commands(self) -> None:
+        while True:
+            try:
+                cmd, args, slot, done = self._commands.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                slot["response"] = self._handle_command(cmd, args)
+            except Exception as e:
+                slot["response"] = {"ok": False, "error": str(e)}
+            done.set()
+
+    def _handle_command(self, cmd: str, args: list[str]) -> dict[str, Any]:
+        if cmd == "pause":
+            self.paused = True
+            logger.warning("Мониторинг на паузе: новые запуски не начинаются (идёт {})", len(self.running))
+        elif cmd == "resume":
+            self.paused = self.draining = False
+            logger.info("Мониторинг продолжен")
+        elif cmd == "drain":
+            self.draining = True
+            logger.warning("Мониторинг завершится после текущих запусков: {}", len(self.running))
+        elif cmd == "run":
+            if not args:
+                return {"ok": False, "error": "укажите адрес: run <адрес>"}
+            addr = evm.to_checksum_address(args[0]) if re.match(r"^0x[a-fA-F0-9]{40}$", args[0]) else args[0]
+            if addr not in self.registry:
+                return {"ok": False, "error": f"адрес {args[0]} не найден среди ключей"}
+            if addr in self._running_addresses():
+                return {"ok": False, "error": f"{addr} уже выполняется"}
+            self._retry_at.pop(addr, None)
+            self.sched.add(addr, 0.0)
+            logger.info("Аккаунт {} поставлен в начало очереди (команда run)", addr)
+        elif cmd == "concurrency":
+            try:
+                n = int(args[0])
+            except (IndexError, ValueError):
+                return {"ok": False, "error": "укажите число: concurrency <n>"}
+            if not 1 <= n <= MONITOR_MAX_WORKERS:
+                return {"ok": False, "error": f"допустимо от 1 до {MONITOR_MAX_WORKERS}"}
+            if self.controller:
+                self.controller.set_max(n)
+            else:
+                logger.info("Параллельных запусков: {} → {} (команда concurrency)", self.workers, n)
+            self.workers = n
+        return {"ok": True, **self.state()}
+
+    def state(self) -> dict[str, Any]:
+        now = time.time()
+        return {
+            "paused": self.paused,
+            "draining": self.draining,
+            "limit": self.limit,
+            "max_workers": self.workers,
+            "adaptive": self.controller is not None,
+            "lookahead_sec": self.lookahead,
+            "batch_size": self.batch_size,
+            "keys": len(self.registry),
+            "running": sorted(self._running_addresses()),
+            "retrying": len(self._retry_at),
+            "scheduler": self.sched.state(now),
+        }
+
+    # --- цикл ---
+
+    def _dispatch(self, now: float) -> None:
+        if self.paused or self.draining:
+            return
+        horizon = now + self.lookahead
+        limit = self.controller.update(len(self.running), self.sched.has_due(horizon)) if self.controller else self.limit
+        while len(self.running) < limit:
+            picked = self.sched.dispatch(horizon, 1)
+            if not picked:
+                break
+            addr, due_ts = picked[0]
+            if self._retry_at.pop(addr, None) is not None:
+                due_ts = min(due_ts, now)  # повтор: выдан по времени повтора, без упреждения
+            resume = self.resume_entries.pop(addr, None)
+            batch = self._batch_group(now, horizon, addr, due_ts) if not resume else []
+            if len(batch) > 1:
+                logger.info("Запуск пакета для GM: {}", ", ".join(f"{m['address']} (ключ #{m['key_index'] + 1})"
+                                                                  for m in batch))
+                fut = self._executor.submit(_run_batch_job, self.manager, batch)
+                addrs = [m["address"] for m in batch]
+            else:
+                key_index = self.registry.key_index(addr)
+                gm_not_before = due_ts if due_ts > now and not resume else None
+                logger.info("Запуск аккаунта для GM: {} (ключ #{}){}", addr, key_index + 1,
+                            ", продолжение прерванного запуска" if resume
+                            else f", заранее: до срока {due_ts - now:.0f} с" if gm_not_before else "")
+                fut = self._executor.submit(
+                    _run_account_job, self.manager, addr, key_index, resume, gm_not_before,
+                    self.registry.private_key(addr),
+                )
+                addrs = [addr]
+            fut.add_done_callback(lambda _: self._wake.set())
+            self.running[fut] = addrs
+
+    def _batch_group(self, now: float, horizon: float, addr: str, due_ts: float) -> list[dict]:
+        """
+        Пакет из addr и следующих «должных» аккаунтов с уже созданным смарт-аккаунтом (не больше batch_size).
+        Пустой список — addr идёт отдельным запуском; не вошедшие в пакет кандидаты возвращаются в план.
+        """
+        if self.batch_size <= 1 or addr in self._single_only:
+            return []
+        candidates = [(addr, due_ts)] + self.sched.dispatch(horizon, self.batch_size * BATCH_SCAN_FACTOR - 1)
+        flags = db.get_smart_account_flags([a for a, _ in candidates])
+        chosen: list[tuple[str, float]] = []
+        if flags.get(addr):
+            for a, ts in candidates:
+                if len(chosen) < self.batch_size and flags.get(a) and a not in self.resume_entries \
+                        and a not in self._single_only:
+                    chosen.append((a, ts))
+        if len(chosen) < 2:
+            chosen = []
+        picked = {a for a, _ in chosen}
+        for a, ts in candidates[1:]:
+            if a not in picked:
+                self.sched.add(a, ts, order=self.registry.key_index(a))
+        batch = []
+        for a, ts in chosen:
+            if self._retry_at.pop(a, None) is not None:
+                ts = min(ts, now)
+            batch.append(
+                {
+                    "address": a,
+                    "key_index": self.registry.key_index(a),
+                    "private_key": self.registry.private_key(a),
+                    "gm_not_before": ts if ts > now else None,
+                }
+            )
+        return batch
+
+    def _collect_done(self) -> None:
+        for fut in [f for f in self.running if f.done()]:
+            addrs = self.running.pop(fut)
+            error: Optional[BaseException] = None
+            try:
+                result = fut.result()
+                if result is not None:  # пакет: (адреса для отдельного запуска, ошибка)
+                    fallback, error = result
+                    self._single_only.update(fallback)
+                else:
+                    self._single_only.discard(addrs[0])
+            except Exception as e:
+                error = e
+                _log_job_error(addrs[0], e)
+            if self.controller and not (error and _is_adspower_limit(str(error))):
+                self.controller.record_run(ok=error is None, timed_out=error is not None and _is_timeout_error(error))
+            for addr in addrs:
+                if addr in self.registry:
+                    self._reschedule(addr)
+
+    def run(self, all_keys: list[str], started_at: Optional[float] = None) -> None:
+        self.registry.load(all_keys)
+        if not len(self.registry):
+            logger.error("Не удалось получить адреса из ключей")
+            return
+        self._schedule(self.registry.addresses())
+        self._restore_inflight()
+        if started_at is not None:
+            logger.info("Холодный старт до начала мониторинга: {:.3f} с", time.perf_counter() - started_at)
+        logger.info("Мониторинг запущен (аккаунтов {}, воркеров {}{}, политика {}, упреждение {} с{}). Остановка: Ctrl+C.",
+                    len(self.registry), self.workers, " (адаптивно)" if self.controller else "", self.policy,
+                    self.lookahead, f", пакеты до {self.batch_size}" if self.batch_size > 1 else "")
+
+        server = ControlServer(self.submit_command)
+        server.start()
+        try:
+            while True:
+                self._wake.clear()
+                self._reload_keys()
+                self._process_commands()
+                self._collect_done()
+                if self.draining and not self.running:
+                    logger.info("Все запуски завершены, мониторинг остановлен (drain)")
+                    break
+                now = time.time()
+                self._dispatch(now)
+                if time.monotonic() - self._state_published >= SCHEDULER_METRICS_INTERVAL_SEC:
+                    # state() проходит по всей очереди (O(n)) — не на каждой итерации цикла
+                    self._state_published = time.monotonic()
+                    metrics.publish("scheduler", self.state())
+
+                idle = self.paused or self.draining or len(self.running) >= self.limit
+                wake = None if idle else self.sched.next_wakeup(now + self.lookahead)
+                timeout = MONITOR_INTERVAL_SEC
+                if wake is not None:
+                    timeout = min(max(0.0, wake - self.lookahead - now), MONITOR_INTERVAL_SEC)
+                if self.running:
+                    self._wake.wait(timeout)
+                elif timeout > 0:
+                    _wait_with_spinner(timeout, wake=self._wake)
         except KeyboardInterrupt:
             logger.warning("Мониторинг остановлен")
-            break
-        except Exception as e:
-            err_msg = str(e)
-            if current_addr and ("Exceeding import daily limit" in err_msg or "recovery after" in err_msg.lower()):
-                # При лимите AdsPower профили просто пропускаем: расписание next_gm_available_at не трогаем,
-                # чтобы его не смещать искусственно на 10 часов.
-                logger.warning("Лимит AdsPower (создание профилей). Аккаунт {} пропущен.", current_addr)
-            else:
-                logger.error("Ошибка мониторинга: {}", err_msg)
-            time.sleep(MONITOR_INTERVAL_SEC)
+            if self.running:
+                logger.warning("Ожидаем завершения текущих запусков: {} (повторный Ctrl+C — выход без ожидания, "
+                               "незавершённые продолжатся при следующем старте)", len(self.running))
+            try:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            except KeyboardInterrupt:
+                server.close()
+                logger.complete()
+                os._exit(130)
+        finally:
+            server.close()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            metrics.flush()
+
+
+def run_monitor(
+    manager: StartaleGMBrowser,
+    all_keys: list[str],
+    started_at: Optional[float] = None,
+    workers: int = MONITOR_WORKERS,
+    policy: str = MONITOR_POLICY,
+    lookahead: float = MONITOR_LOOKAHEAD_SEC,
+    adaptive: bool = False,
+    batch_size: int = MONITOR_BATCH_SIZE,
+) -> None:
+    """
+    Мониторинг GM (см. Monitor).
+    lookahead — за сколько секунд до срока начинать запуск: профиль, импорт и подключение кошелька
+    выполняются заранее, а "Send GM back" нажимается к сроку.
+    adaptive — число параллельных запусков подбирается (modules/concurrency.py) от 1 до workers.
+    batch_size — сколько аккаунтов с готовым смарт-аккаунтом обрабатывать в одном браузере (1 — без пакетов).
+    """
+    Monitor(
+        manager, workers=workers, policy=policy, lookahead=lookahead, adaptive=adaptive, batch_size=batch_size
+    ).run(all_keys, started_at=started_at)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Адаптивные таймауты шагов сценария.
+
+Для каждого именованного шага (см. RunTrace.step) хранится скользящее окно длительностей успешных выполнений.
+Таймаут шага = STEP_TIMEOUT_MULTIPLIER × p99 окна, но не меньше STEP_TIMEOUT_FLOOR_MS и не больше
+потолка шага (прежнее жёстко заданное значение). Пока замеров меньше STEP_MIN_SAMPLES, используется потолок.
+Падения по сниженному таймауту в окно не попадают: они считаются подряд, и каждое добавляет к таймауту
+STEP_TIMEOUT_STREAK_BOOST, но не больше чем до STEP_TIMEOUT_MAX_BOOST × базового значения — серия зависаний
+не возвращает таймауты к потолку, а реальное замедление шага всё же получает запас и попадает в окно успехами.
+Окна сохраняются в step_latency.json и переживают перезапуск мониторинга; текущие значения — раздел
+"step_timeouts" метрик.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+from modules import metrics
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+STATS_PATH = PROJECT_ROOT / "step_latency.json"
+
+STEP_TIMEOUT_MULTIPLIER = 3.0
+STEP_TIMEOUT_FLOOR_MS = 5000
+STEP_MIN_SAMPLES = 20
+STEP_WINDOW = 200
+STEP_TIMEOUT_STREAK_BOOST = 0.25
+STEP_TIMEOUT_MAX_BOOST = 2.0
+
+
+class StepTimeouts:
+    """Скользящие окна длительностей по шагам и вычисление таймаутов. Потокобезопасен."""
+
+    def __init__(self, path: Path = STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # запуски в нескольких воркерах: один .tmp-файл на запись
+        self._samples: dict[str, list[int]] = {}
+        # Падения по сниженному таймауту подряд (сбрасываются успехом шага)
+        self._timeout_streak: dict[str, int] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = f.read().strip()
+            data = json.loads(raw) if raw else {}
+        except (json.JSONDecodeError, ValueError, OSError):
+            return
+        for name, rec in (data.get("steps") or {}).items():
+            samples = rec.get("samples_ms") if isinstance(rec, dict) else None
+            if isinstance(samples, list):
+                self._samples[name] = [int(v) for v in samples if isinstance(v, (int, float))][-STEP_WINDOW:]
+
+    def save(self) -> None:
+        """Атомарно сохраняет окна в step_latency.json (если были новые замеры)."""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {"steps": {name: {"samples_ms": list(s)} for name, s in self._samples.items()}}
+                self._dirty = False
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        metrics.publish("step_timeouts", self.snapshot())
+
+    def observe(self, name: str, duration_ms: float) -> None:
+        """Добавляет длительность успешного выполнения шага в окно."""
+        with self._lock:
+            window = self._samples.setdefault(name, [])
+            window.append(int(duration_ms))
+            if len(window) > STEP_WINDOW:
+                del window[: len(window) - STEP_WINDOW]
+            self._timeout_streak.pop(name, None)
+            self._dirty = True
+
+    def observe_timeout(self, name: str) -> None:
+        """Учитывает падение шага по сниженному таймауту (в окно длительностей не попадает)."""
+        with self._lock:
+            self._timeout_streak[name] = self._timeout_streak.get(name, 0) + 1
+
+    def p99_ms(self, name: str) -> Optional[int]:
+        with self._lock:
+            window = sorted(self._samples.get(name, ()))
+        if len(window) < STEP_MIN_SAMPLES:
+            return None
+        return window[max(1, math.ceil(0.99 * len(window))) - 1]
+
+    def timeout_ms(self, name: str, ceiling_ms: int) -> int:
+        """
+        Таймаут шага: множитель × p99 (с запасом за падения по таймауту подряд) в пределах [пол, потолок];
+        без статистики — потолок.
+        """
+        p99 = self.p99_ms(name)
+        if p99 is None:
+            return ceiling_ms
+        with self._lock:
+            streak = self._timeout_streak.get(name, 0)
+        boost = min(STEP_TIMEOUT_MAX_BOOST, 1.0 + STEP_TIMEOUT_STREAK_BOOST * streak)
+        value = int(STEP_TIMEOUT_MULTIPLIER * p99 * boost)
+        return max(min(STEP_TIMEOUT_FLOOR_MS, ceiling_ms), min(value, ceiling_ms))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Текущие p99, число замеров и падений по таймауту подряд по шагам (раздел "step_timeouts" метрик)."""
+        with self._lock:
+            names = list(self._samples)
+            streaks = dict(self._timeout_streak)
+        return {
+            name: {"samples": len(self._samples.get(name, ())), "p99_ms": self.p99_ms(name),
+                   "timeouts_in_row": streaks.get(name, 0)}
+            for name in names
+        }
+
+
+_instance: Optional[StepTimeouts] = None
+_instance_lock = threading.Lock()
+
+
+def get_step_timeouts() -> StepTimeouts:
+    """Общий на процесс экземпляр StepTimeouts (загружается из step_latency.json при первом обращении)."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = StepTimeouts()
+        return _instance